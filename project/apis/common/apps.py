@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class CommonConfig(AppConfig):
     name = 'apis.common'
+
+    def ready(self):
+        from django.db.models.signals import post_save, post_delete
+        from apis.common.models import GenericSystemSettings
+        from apis.common.utilities.generic_configuration import bump_settings_version
+
+        post_save.connect(bump_settings_version, sender=GenericSystemSettings, dispatch_uid='generic_system_settings_saved')
+        post_delete.connect(bump_settings_version, sender=GenericSystemSettings, dispatch_uid='generic_system_settings_deleted')
@@ -1,9 +1,9 @@
 import traceback
 import logging
-import requests
 
 from django.conf import settings
 
+from apis.common.utilities.generic_configuration import GenericConfiguration
 from apis.components.base.base_manager import BaseModelManager
 from apis.components.factories.utility import SingletonBaseClass
 
@@ -39,17 +39,33 @@ class SystemSettingsManager(BaseModelManager, metaclass = SingletonBaseClass):
     def get_manager_name():
         return "SystemSettingsManager"
 
+    '''
+        Description: Reload GenericSystemSettings. Settings are cached in GenericConfiguration (one immutable snapshot 
+            per process, reloaded when the shared version is changed), this manager reads parsed values (stripped, 
+            lists of EMAIL settings) of the same snapshot. django.conf.settings are not changed.
+        Parameters:
+            1. params (Dic): not used, kept for compatibility
+        Returns:    Dic of {'count': number of settings, 'data': parsed settings (read-only dict)}
+        Exception:  None
+    '''
     def refresh_system_settings(self, params=None, **kwargs):
-        lst = self.list(params=params, **kwargs)
-        if lst and lst.get('count',0)>0:
-            for item in lst['data']:
-                prop_value = item.prop_value
-                prop_type = item.prop_type
-                if prop_type and prop_type.upper() == 'EMAIL' and "," in prop_value:
-                    prop_value = prop_value.split(",")
-                    prop_value = [x.strip() for x in prop_value if x]
-                else:
-                    prop_value = prop_value.strip()
-                setattr(settings, item.prop_key, prop_value)
-        return lst
+        system_settings = GenericConfiguration.get_instance().refresh_system_settings_dict().parsed_values
+        return {'count': len(system_settings), 'data': system_settings}
 
+    def get_system_settings(self):
+        return GenericConfiguration.get_instance().get_snapshot().parsed_values
+
+    '''
+        Description: Value of a system setting, from cached snapshot of GenericSystemSettings. If the setting is not 
+            in GenericSystemSettings, value is taken from django.conf.settings.
+        Parameters:
+            1. key (String): prop_key of setting
+            2. default: value if setting is not found
+        Returns:    value of setting (String, or List for EMAIL lists)
+        Exception:  None
+    '''
+    def get_system_setting(self, key, default=None):
+        system_settings = self.get_system_settings()
+        if key in system_settings:
+            return system_settings[key]
+        return getattr(settings, key, default)
@@ -1,3 +1,123 @@
-from django.test import TestCase
+import datetime
+import os
 
-# Create your tests here.
+import django
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from apis.common.managers import SystemSettingsManager
+from apis.common.models import GenericSystemSettings
+from apis.common.utilities.generic_configuration import SETTINGS_VERSION_PROP_KEY, GenericConfiguration
+from apis.common.utilities.request_timing import is_server_timing_header
+from middleware.custom_middleware import CustomMainMiddleware, get_timezone
+
+
+class ServerTimingHeaderTests(TestCase):
+
+    def get_response(self):
+        middleware = CustomMainMiddleware(lambda request: HttpResponse('ok'))
+        return middleware(RequestFactory().get('/metrics/'))
+
+    @override_settings(DEBUG=False, REQUEST_TIMING={})
+    def test_header_is_not_sent_by_default(self):
+        self.assertFalse(is_server_timing_header())
+        self.assertFalse(self.get_response().has_header('Server-Timing'))
+
+    @override_settings(DEBUG=True, REQUEST_TIMING={})
+    def test_header_is_sent_in_debug(self):
+        self.assertTrue(is_server_timing_header())
+        self.assertTrue(self.get_response().has_header('Server-Timing'))
+
+    @override_settings(DEBUG=True, REQUEST_TIMING={'SERVER_TIMING_HEADER': False})
+    def test_header_can_be_disabled(self):
+        self.assertFalse(is_server_timing_header())
+        self.assertFalse(self.get_response().has_header('Server-Timing'))
+
+
+class SystemSettingsManagerTests(TestCase):
+
+    def setUp(self):
+        self.manager = SystemSettingsManager()
+        self.configuration = GenericConfiguration.get_instance()
+        self.configuration.snapshot = None
+        GenericSystemSettings.objects.create(prop_key='SUPPORT_EMAILS', prop_value='a@example.com, b@example.com',
+                                             prop_type='Email')
+        GenericSystemSettings.objects.create(prop_key='SITE_TITLE', prop_value=' Portal ', prop_type='Other')
+
+    def tearDown(self):
+        self.configuration.snapshot = None
+
+    def test_settings_are_read_from_shared_snapshot(self):
+        self.assertEqual(self.manager.get_system_setting('SUPPORT_EMAILS'), ['a@example.com', 'b@example.com'])
+        self.assertEqual(self.manager.get_system_setting('SITE_TITLE'), 'Portal')
+        self.assertEqual(self.configuration.fetch_value('SITE_TITLE'), ' Portal ')
+        self.assertIs(self.manager.get_system_settings(), self.configuration.snapshot.parsed_values)
+        self.assertFalse(hasattr(settings, 'SITE_TITLE'))
+
+    def test_missing_setting_falls_back_to_django_settings(self):
+        self.assertEqual(self.manager.get_system_setting('TIME_ZONE'), settings.TIME_ZONE)
+        self.assertEqual(self.manager.get_system_setting('NOT_A_SETTING', 'default'), 'default')
+
+    def test_changed_version_reloads_settings(self):
+        self.assertEqual(self.manager.get_system_setting('SITE_TITLE'), 'Portal')
+        GenericSystemSettings.objects.filter(prop_key='SITE_TITLE').delete()  # post_delete bumps version
+        self.assertIsNone(self.manager.get_system_setting('SITE_TITLE'))
+        self.assertEqual(self.manager.refresh_system_settings()['count'], 1)
+
+    def test_periodic_refresh_is_started_once_per_process(self):
+        self.configuration.refresh_pid = None
+        self.assertFalse(self.configuration.start_periodic_refresh(interval=0))
+        self.assertTrue(self.configuration.start_periodic_refresh(interval=3600))
+        self.assertFalse(self.configuration.start_periodic_refresh(interval=3600))
+        self.configuration.refresh_pid = -1  # e.g. started in master process, before fork
+        self.assertTrue(self.configuration.start_periodic_refresh(interval=3600))
+
+    def test_periodic_refresh_is_on_by_default(self):
+        self.configuration.refresh_pid = None
+        self.manager.get_system_settings()
+        self.assertEqual(self.configuration.refresh_pid, os.getpid())
+
+
+class GetTimezoneTests(SimpleTestCase):
+
+    def test_timezone_works_with_installed_django(self):
+        tz = get_timezone('Asia/Kolkata')
+        if django.VERSION < (3, 2):
+            self.assertTrue(hasattr(tz, 'localize'))  # pytz timezone
+        value = timezone.make_aware(datetime.datetime(2020, 1, 1, 12, 0), tz)
+        self.assertEqual(value.utcoffset(), datetime.timedelta(hours=5, minutes=30))
+
+    def test_unknown_timezone(self):
+        self.assertIsNone(get_timezone('Not/A_Zone'))
+
+
+class GenericConfigurationTests(TestCase):
+
+    def setUp(self):
+        self.configuration = GenericConfiguration.get_instance()
+        self.configuration.snapshot = None
+
+    def tearDown(self):
+        self.configuration.snapshot = None
+
+    def test_saved_setting_is_seen_by_worker_cache(self):
+        GenericSystemSettings.objects.create(prop_key='SITE_TITLE', prop_value='Portal', prop_type='Other')
+        self.assertEqual(self.configuration.fetch_value('SITE_TITLE'), 'Portal')
+        setting = GenericSystemSettings.objects.get(prop_key='SITE_TITLE')
+        setting.prop_value = 'New Portal'
+        setting.save()  # post_save bumps shared version
+        self.assertEqual(self.configuration.fetch_value('SITE_TITLE'), 'New Portal')
+        self.assertEqual(self.configuration.fetch_value('TIME_ZONE'), settings.TIME_ZONE)
+        self.assertNotIn(SETTINGS_VERSION_PROP_KEY, self.configuration.get_system_settings_dict())
+
+    def test_version_bumped_by_other_worker_is_seen(self):
+        GenericSystemSettings.objects.create(prop_key='SITE_TITLE', prop_value='Portal', prop_type='Other')
+        self.assertEqual(self.configuration.fetch_value('SITE_TITLE'), 'Portal')
+        # another worker saved the setting: only database is changed, not this process
+        GenericSystemSettings.objects.filter(prop_key='SITE_TITLE').update(prop_value='New Portal')
+        GenericSystemSettings.objects.filter(prop_key=SETTINGS_VERSION_PROP_KEY).update(prop_value='other worker')
+        self.assertEqual(self.configuration.fetch_value('SITE_TITLE'), 'Portal')  # until next version check
+        self.configuration.next_version_check = 0
+        self.assertEqual(self.configuration.fetch_value('SITE_TITLE'), 'New Portal')
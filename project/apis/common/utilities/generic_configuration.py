@@ -1,15 +1,67 @@
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import namedtuple
+from functools import reduce
+from types import MappingProxyType
+
 from apis.common.models import GenericSystemSettings
 from django.conf import settings
+from django.db import connection
+
+'''
+    GenericSystemSettings are cached in each process (worker) as an immutable snapshot with a version stamp. Version
+    is stored in the database (row SETTINGS_VERSION_PROP_KEY of GenericSystemSettings), so it is shared by all workers
+    without a shared cache backend, and it is changed (bump_settings_version) when a setting is saved / deleted
+    (post_save / post_delete signals, connected in CommonConfig.ready()). Each worker checks version at most once in
+    "GENERIC_SETTINGS_CHECK_INTERVAL" seconds (one single-row query) and reloads settings only when version is changed.
+    A background thread per worker checks version every "SYSTEM_SETTINGS_REFRESH_INTERVAL" seconds (0: disabled), so
+    an idle worker is up to date too.
+    Note: QuerySet.update() does not send signals, call bump_settings_version() after it.
+'''
+SETTINGS_VERSION_PROP_KEY = '__settings_version__'
+
+'''
+    values: raw prop_value by prop_key (fetch_value()), parsed_values: stripped values and lists of EMAIL settings
+    (SystemSettingsManager), version: version stamp the snapshot was loaded with.
+'''
+SystemSettingsSnapshot = namedtuple('SystemSettingsSnapshot', ['values', 'parsed_values', 'version'])
+
+
+def bump_settings_version(sender=None, **kwargs):
+    version = uuid.uuid4().hex
+    if not GenericSystemSettings.objects.filter(prop_key=SETTINGS_VERSION_PROP_KEY).update(prop_value=version):
+        # bulk_create() does not send post_save, so version row does not bump version again
+        GenericSystemSettings.objects.bulk_create([GenericSystemSettings(prop_key=SETTINGS_VERSION_PROP_KEY, prop_value=version,
+                                                                         prop_type='Other', description='Version of system settings')])
+    instance = GenericConfiguration._GenericConfiguration__instance
+    if instance is not None:
+        instance.next_version_check = 0  # current process see new version on next fetch_value()
+
+
+def parse_setting_value(prop_value, prop_type):
+    if prop_type and prop_type.upper() == 'EMAIL' and "," in prop_value:
+        return [x.strip() for x in prop_value.split(",") if x]
+    return prop_value.strip()
+
 
 class GenericConfiguration:
     __instance = None
+    default_check_interval = 5  # Seconds, settings.GENERIC_SETTINGS_CHECK_INTERVAL
+    default_refresh_interval = 60  # Seconds, settings.SYSTEM_SETTINGS_REFRESH_INTERVAL
 
     def __init__(self):
         """ Virtually private constructor. """
         if GenericConfiguration.__instance != None:
             raise Exception("This class is a singleton!")
         else:
-            self.system_settings_dict = dict(GenericSystemSettings.objects.values_list('prop_key', 'prop_value'))
+            self.snapshot = None  # loaded lazily, on first fetch_value()
+            self.next_version_check = 0
+            self.reload_lock = threading.Lock()
+            self.refresh_pid = None  # process in which periodic refresh is running
             GenericConfiguration.__instance = self
 
 
@@ -20,10 +72,93 @@ class GenericConfiguration:
             GenericConfiguration()
         return GenericConfiguration.__instance
 
+    def get_check_interval(self):
+        return getattr(settings, 'GENERIC_SETTINGS_CHECK_INTERVAL', self.default_check_interval)
+
+    def get_shared_version(self):
+        versions = GenericSystemSettings.objects.filter(prop_key=SETTINGS_VERSION_PROP_KEY).order_by('-id')
+        return versions.values_list('prop_value', flat=True).first() or ''
+
     def refresh_system_settings_dict(self):
-        self.system_settings_dict = dict(GenericSystemSettings.objects.values_list('prop_key', 'prop_value'))
+        with self.reload_lock:
+            values = {}
+            parsed_values = {}
+            version = ''
+            # version is read by the same query, so snapshot is consistent with its version
+            for prop_key, prop_value, prop_type in GenericSystemSettings.objects.order_by('id').values_list('prop_key', 'prop_value', 'prop_type'):
+                if prop_key == SETTINGS_VERSION_PROP_KEY:
+                    version = prop_value
+                    continue
+                values[prop_key] = prop_value
+                parsed_values[prop_key] = parse_setting_value(prop_value, prop_type)
+            self.snapshot = SystemSettingsSnapshot(MappingProxyType(values), MappingProxyType(parsed_values), version)  # atomic swap
+            self.next_version_check = time.time() + self.get_check_interval()
+            return self.snapshot
+
+    def check_version(self):
+        snapshot = self.snapshot
+        self.next_version_check = time.time() + self.get_check_interval()
+        if self.get_shared_version() != snapshot.version and not self.reload_lock.locked():  # other thread may be reloading
+            return self.refresh_system_settings_dict()
+        return snapshot
+
+    '''
+        Description: Current snapshot of GenericSystemSettings, it is reloaded if version is changed.
+        Parameters: None
+        Returns:    SystemSettingsSnapshot
+        Exception:  None
+    '''
+    def get_snapshot(self):
+        self.start_periodic_refresh()
+        snapshot = self.snapshot
+        if snapshot is None:
+            return self.refresh_system_settings_dict()
+        if time.time() >= self.next_version_check:
+            return self.check_version()
+        return snapshot
+
+    def get_system_settings_dict(self):
+        return self.get_snapshot().values
 
     def fetch_value(self, key):
-         if key in self.system_settings_dict:
-             return self.system_settings_dict[key]
-         return eval('settings.'+ key)
\ No newline at end of file
+        system_settings_dict = self.get_system_settings_dict()
+        if key in system_settings_dict:
+            return system_settings_dict[key]
+        return reduce(getattr, key.split('.'), settings)
+
+    '''
+        Description: Check version periodically in a daemon thread, once per process. It is called on first read of
+            settings in each process (worker), so the thread is started after fork and not in the master process.
+        Parameters:
+            1. interval (Integer): seconds, default is settings.SYSTEM_SETTINGS_REFRESH_INTERVAL (0: disabled)
+        Returns:    Boolean, True if background refresh is started
+        Exception:  None
+    '''
+    def start_periodic_refresh(self, interval=None):
+        if interval is None:
+            interval = getattr(settings, 'SYSTEM_SETTINGS_REFRESH_INTERVAL', self.default_refresh_interval)
+        pid = os.getpid()
+        if not interval or self.refresh_pid == pid:
+            return False
+        with self.reload_lock:
+            if self.refresh_pid == pid:
+                return False
+            refresh_thread = threading.Thread(target=self.periodic_refresh, args=(interval,), name='SystemSettingsRefresh')
+            refresh_thread.daemon = True
+            refresh_thread.start()
+            self.refresh_pid = pid
+        return True
+
+    def periodic_refresh(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                if self.snapshot is None:
+                    self.refresh_system_settings_dict()
+                else:
+                    self.check_version()
+            except Exception as e:
+                logging.info("Path apis/common/utilities/generic_configuration.py  Class: GenericConfiguration Method: periodic_refresh(...)  Error: %s" % (str(e)))
+                logging.info(traceback.format_exc())
+            finally:
+                connection.close()  # this thread is not a request, close its database connection
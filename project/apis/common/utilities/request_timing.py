@@ -0,0 +1,227 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+'''
+    Request timing is configured by settings.REQUEST_TIMING e.g.
+        REQUEST_TIMING = {
+            'ENABLED': True,                # time each request in CustomMainMiddleware (metrics only, response is not changed)
+            'SERVER_TIMING_HEADER': None,   # add "Server-Timing" header in response, True: always, None: only if DEBUG
+            'METRICS_ENDPOINT': False,      # expose histograms at /metrics/ (Prometheus text, ?format=json for JSON)
+        }
+'''
+REQUEST_TIMING_DEFAULTS = {
+    'ENABLED': True,
+    'SERVER_TIMING_HEADER': None,  # timings and query count are internal details, not sent to clients in production
+    'METRICS_ENDPOINT': False,
+}
+
+SECTION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_request_timer_local = threading.local()
+
+
+def get_request_timing_settings():
+    timing_settings = dict(REQUEST_TIMING_DEFAULTS)
+    timing_settings.update(getattr(settings, 'REQUEST_TIMING', {}) or {})
+    return timing_settings
+
+
+def is_server_timing_header():
+    server_timing_header = get_request_timing_settings()['SERVER_TIMING_HEADER']
+    if server_timing_header is None:
+        return bool(settings.DEBUG)
+    return bool(server_timing_header)
+
+
+class RequestTimer(object):
+    '''
+        Description: Timings of one request i.e. wall time, time of sections (manager, serializer, render etc.) and
+            database time / number of queries. It is also a database execute wrapper (connection.execute_wrapper).
+    '''
+    def __init__(self):
+        self.start_time = time.time()
+        self.end_time = None
+        self.sections = OrderedDict()
+        self.labels = {}
+        self.db_time = 0.0
+        self.query_count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.time()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time = self.db_time + (time.time() - start)
+            self.query_count = self.query_count + 1
+
+    def add_section(self, name, duration):
+        self.sections[name] = self.sections.get(name, 0.0) + duration
+
+    def set_labels(self, **labels):
+        self.labels.update(labels)
+
+    def stop(self):
+        if self.end_time is None:
+            self.end_time = time.time()
+        return self.end_time - self.start_time
+
+    @property
+    def total_time(self):
+        return (self.end_time or time.time()) - self.start_time
+
+    def server_timing(self):
+        timings = ['total;dur=%.2f' % (self.total_time * 1000),
+                   'db;dur=%.2f;desc="%s queries"' % (self.db_time * 1000, self.query_count)]
+        for name, duration in self.sections.items():
+            timings.append('%s;dur=%.2f' % (name, duration * 1000))
+        return ', '.join(timings)
+
+
+def start_request_timer():
+    _request_timer_local.timer = RequestTimer()
+    return _request_timer_local.timer
+
+
+def get_request_timer():
+    return getattr(_request_timer_local, 'timer', None)
+
+
+def clear_request_timer():
+    _request_timer_local.timer = None
+
+
+'''
+    Description: Measure time of a section (e.g. "manager", "serializer") of current request.
+        It does nothing if request is not timed (e.g. out of request or timing disabled).
+    Parameters:
+        1. name (String): name of section
+    Returns:    context manager
+    Exception:  None
+'''
+@contextmanager
+def timed_section(name):
+    timer = get_request_timer()
+    if timer is None:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        timer.add_section(name, time.time() - start)
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count = self.count + 1
+        self.sum = self.sum + value
+        for index, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                self.bucket_counts[index] = self.bucket_counts[index] + 1
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': self.sum,
+                'buckets': OrderedDict((str(bucket), count) for bucket, count in zip(self.buckets, self.bucket_counts))}
+
+
+class MetricsRegistry(object):
+    '''
+        Description: In-process aggregated metrics (histograms and counters) with labels,
+            which can be dumped in Prometheus text format or as dict (JSON).
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = OrderedDict()
+        self.counters = OrderedDict()
+        self.descriptions = {}
+
+    def observe(self, name, value, buckets=SECTION_BUCKETS, description=None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+            if description:
+                self.descriptions[name] = description
+
+    def inc(self, name, value=1, description=None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            if description:
+                self.descriptions[name] = description
+
+    def to_dict(self):
+        with self.lock:
+            histograms = [{'name': name, 'labels': dict(labels), 'value': histogram.to_dict()}
+                          for (name, labels), histogram in self.histograms.items()]
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in self.counters.items()]
+        return {'histograms': histograms, 'counters': counters}
+
+    def to_prometheus(self):
+        lines = []
+        written_types = set()
+        with self.lock:
+            for (name, labels), histogram in self.histograms.items():
+                self.write_type(lines, written_types, name, 'histogram')
+                for bucket, count in zip(histogram.buckets, histogram.bucket_counts):
+                    lines.append('%s_bucket%s %s' % (name, format_labels(labels + (('le', str(bucket)),)), count))
+                lines.append('%s_bucket%s %s' % (name, format_labels(labels + (('le', '+Inf'),)), histogram.count))
+                lines.append('%s_sum%s %s' % (name, format_labels(labels), histogram.sum))
+                lines.append('%s_count%s %s' % (name, format_labels(labels), histogram.count))
+            for (name, labels), value in self.counters.items():
+                self.write_type(lines, written_types, name, 'counter')
+                lines.append('%s%s %s' % (name, format_labels(labels), value))
+        return '\n'.join(lines) + '\n'
+
+    def write_type(self, lines, written_types, name, metric_type):
+        if name in written_types:
+            return
+        written_types.add(name)
+        if name in self.descriptions:
+            lines.append('# HELP %s %s' % (name, self.descriptions[name]))
+        lines.append('# TYPE %s %s' % (name, metric_type))
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                             for key, value in labels)
+
+
+metrics_registry = MetricsRegistry()
+
+
+'''
+    Description: Add timings of finished request in metrics (histograms), labeled by controller and service_method.
+    Parameters:
+        1. timer : RequestTimer
+    Returns:    None
+    Exception:  None
+'''
+def record_request_metrics(timer):
+    labels = {'controller': timer.labels.get('controller', 'other'),
+              'service_method': timer.labels.get('service_method', '')}
+    metrics_registry.observe('request_duration_seconds', timer.total_time,
+                             description='Wall time of request', **labels)
+    metrics_registry.observe('request_db_duration_seconds', timer.db_time,
+                             description='Database time of request', **labels)
+    metrics_registry.observe('request_db_queries', timer.query_count, buckets=QUERY_COUNT_BUCKETS,
+                             description='Number of database queries of request', **labels)
+    for section, duration in timer.sections.items():
+        metrics_registry.observe('request_section_duration_seconds', duration,
+                                 description='Time spent in a layer (manager, serializer, render) of request', section=section, **labels)
@@ -2,10 +2,26 @@ import traceback
 import logging
 
 import base64
+import json
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str, force_text
 from binascii import Error as BinasciiError
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_loads(data):
+    '''
+    Parse JSON from bytes or string, using orjson (if installed) which is much faster than json module.
+    Bytes are parsed directly (without decode to string first).
+    '''
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 
 def find_in_dic_or_list(self, key, dic_or_list, default_value=None):
     if isinstance(dic_or_list, dict):
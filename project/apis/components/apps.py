@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class ComponentsConfig(AppConfig):
     name = 'apis.components'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from apis.components.base.query_inspector import install_slow_query_logger
+
+        connection_created.connect(install_slow_query_logger, dispatch_uid='install_slow_query_logger')
@@ -1,16 +1,98 @@
+import hashlib
 import logging
+import threading
+import time
 import traceback
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor, wait
 
 import json
-import requests
+from urllib.parse import urlsplit
 
 from apis.components.base.base_manager import BaseManager
 
 from django.conf import settings
 from django.core.cache import cache
+from django.db import close_old_connections
+
+_http_sessions = {}
+_http_sessions_lock = threading.Lock()
+_fan_out_executor = None
+_cache_refresh_executor = None
+_call_deadline = ContextVar('api_call_deadline', default=None)  # time.time() by which fan_out_api_calls() needs the response
+_inflight_calls = {}
+_inflight_calls_lock = threading.Lock()
+# "requests" (with urllib3) is imported lazily, on first API call, it is heavy and not needed by every worker
+requests = None
+HTTPAdapter = None
+Retry = None
+
+
+def import_requests():
+    global requests, HTTPAdapter, Retry
+    if requests is None:
+        import requests as requests_module
+        from requests.adapters import HTTPAdapter as adapter_class
+        from urllib3.util.retry import Retry as retry_class
+        HTTPAdapter = adapter_class
+        Retry = retry_class
+        requests = requests_module  # set at last, it mark that all are imported
+    return requests
+
+
+class _InflightCall(object):
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.is_done = False
+
+
+'''
+    Description: Single-flight, concurrent calls with same key (in this process) wait for the first call, 
+        instead of calling func again.
+    Parameters:
+        1. key (String): key of call
+        2. func : function without arguments
+        3. timeout (float): seconds to wait for the first call, after that func is called again
+    Returns:    return value of func
+    Exception:  exception raised by func (only in the first call, waiting calls call func themselves)
+'''
+def single_flight(key, func, timeout=None):
+    with _inflight_calls_lock:
+        inflight_call = _inflight_calls.get(key, None)
+        is_leader = inflight_call is None
+        if is_leader:
+            inflight_call = _InflightCall()
+            _inflight_calls[key] = inflight_call
+
+    if not is_leader:
+        inflight_call.event.wait(timeout)
+        if inflight_call.is_done:
+            return inflight_call.result
+        return func()
+
+    try:
+        inflight_call.result = func()
+        inflight_call.is_done = True
+        return inflight_call.result
+    finally:
+        with _inflight_calls_lock:
+            _inflight_calls.pop(key, None)
+        inflight_call.event.set()
 
 
 class BaseAPIManager(BaseManager):
+    # HTTP connection settings, can be override in Manager or in settings (API_CONNECT_TIMEOUT, API_READ_TIMEOUT, ...)
+    api_connect_timeout = getattr(settings, 'API_CONNECT_TIMEOUT', 5)  # Seconds
+    api_read_timeout = getattr(settings, 'API_READ_TIMEOUT', 30)  # Seconds
+    api_pool_maxsize = getattr(settings, 'API_POOL_MAXSIZE', 10)  # Keep-alive connections per base URL
+    api_get_retries = getattr(settings, 'API_GET_RETRIES', 2)  # Retries of idempotent (GET) requests
+    api_retry_backoff_factor = getattr(settings, 'API_RETRY_BACKOFF_FACTOR', 0.3)  # Sleep 0.3s, 0.6s, 1.2s ... between retries
+    # Automatic caching of list() responses, key is derived from api_name, method and request body
+    cache_timeout = 0  # Seconds a response is fresh, 0 disables automatic caching
+    cache_stale_timeout = 0  # Seconds an expired response is still served, while it is refreshed in background
+    cache_error_timeout = 0  # Seconds a response with errorCodes is cached (negative caching), 0 disables it
 
     def __init__(self, api_name, api_method= 'POST'):
         super(BaseAPIManager, self).__init__()
@@ -87,8 +169,60 @@ class BaseAPIManager(BaseManager):
     def get_api_url(self, params=None, **kwargs):
         return settings.ADESSO_API_BASE_URL + self.api_name
 
+    '''
+        Description: This method return pooled HTTP session (keep-alive connections) shared by all Managers 
+            calling same base URL (scheme + host) with same pool settings. 
+            Only GET requests are retried (connection errors and 502, 503, 504 responses).
+        Parameters:
+            1. api_url (String): URL of API
+        Returns:    object of requests.Session
+        Exception:  None
+    '''
+    def get_http_session(self, api_url):
+        url_parts = urlsplit(api_url)
+        session_key = (url_parts.scheme, url_parts.netloc, self.api_pool_maxsize, self.api_get_retries, self.api_retry_backoff_factor)
+        session = _http_sessions.get(session_key, None)
+        if session is None:
+            with _http_sessions_lock:
+                session = _http_sessions.get(session_key, None)
+                if session is None:
+                    import_requests()
+                    retry = Retry(total=self.api_get_retries, backoff_factor=self.api_retry_backoff_factor,
+                                  status_forcelist=(502, 503, 504), allowed_methods=frozenset(['GET']), raise_on_status=False)
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.api_pool_maxsize, max_retries=retry)
+                    session = requests.Session()
+                    session.mount(url_parts.scheme + '://', adapter)
+                    _http_sessions[session_key] = session
+        return session
+
+    def get_request_timeout(self, params=None, **kwargs):
+        return (self.api_connect_timeout, self.api_read_timeout)
+
+    '''
+        Description: Timeout of HTTP request, get_request_timeout() limited to the time left before deadline of 
+            fan_out_api_calls() (if the call is made by it).
+    '''
+    def get_call_timeout(self, params=None, **kwargs):
+        timeout = self.get_request_timeout(params=params, **kwargs)
+        deadline_at = _call_deadline.get()
+        if deadline_at is None:
+            return timeout
+        remaining = max(deadline_at - time.time(), 0.001)
+        if isinstance(timeout, (tuple, list)):
+            return tuple(remaining if value is None else min(value, remaining) for value in timeout)
+        return remaining if timeout is None else min(timeout, remaining)
+
+    '''
+        Description: This method return response (same as handle_response_call_api), if API could not be called 
+            e.g. connection error or timeout.
+    '''
+    def get_failed_call_api_response(self, request_body, error_code, description, params=None, **kwargs):
+        from project.constants_status import UNKNOWN_ERROR_MESSAGE, INTERNAL_ERROR_1000_INTERNAL_SERVER_ERROR
+        error_info = {"errors": [UNKNOWN_ERROR_MESSAGE], "error_no": INTERNAL_ERROR_1000_INTERNAL_SERVER_ERROR, "error_description": description, "api_status_code": None}
+        return {'errorCodes': [{"errorCode": error_code, "description": description}], 'error_info': error_info}
+
     def event_before_request_filter(self, name, value, api_params={}, params=None, **kwargs):
-        if name in ['data_source', 'order_by', 'service_method', 'fields', 'page', 'page_size', 'logged_in_user', 'filter_session_key']:
+        if name in ['data_source', 'order_by', 'service_method', 'fields', 'page', 'page_size', 'stream', 'debug_queries', 'logged_in_user', 'filter_session_key']:
             return None
         else:
             return {name : value}
@@ -170,7 +304,29 @@ class BaseAPIManager(BaseManager):
 
 
 
-    def call_api(self, params=None, **kwargs):
+    def is_get_api(self):
+        return bool(self.api_method and self.api_method.strip().upper()=='GET')
+
+    '''
+        Description: This method return request body (query parameters for GET) of API call.
+        Parameters:
+            1. params (Dic): Controller can share additional data in this dictionary.
+        Returns:    Dic
+        Exception:  None
+    '''
+    def build_request_body(self, params=None, **kwargs):
+        from apis.common.utilities.function_utility import isMethodExist
+
+        if self.is_get_api() and isMethodExist(self, "get_request_param"):
+            request_body = self.get_request_param(params=params, **kwargs)
+        elif isMethodExist(self, "get_request_body"):
+            request_body = self.get_request_body(params=params, **kwargs)
+        else:
+            query_params = self.get_all_request_params(request_params=params, **kwargs)
+            request_body = self.process_data_for_request(api_request_params=query_params, params=params, **kwargs)
+        return request_body
+
+    def call_api(self, params=None, request_body=None, **kwargs):
         '''
         from jiffyship.fmstatus import UNKNOWN_ERROR_MESSAGE, INTERNAL_NO_ERROR_1001_SUCCESSFULLY_DONE, \
             INTERNAL_WARNING_1004_DATA_NOT_FOUND, INTERNAL_ERROR_1000_INTERNAL_SERVER_ERROR
@@ -180,29 +336,29 @@ class BaseAPIManager(BaseManager):
 
         request_headers = self.get_request_headers(**kwargs)
 
-        from apis.common.utilities.function_utility import isMethodExist
-
-        if self.api_method and self.api_method.strip().upper()=='GET':
+        if request_body is None:  # request body is already built by fetch_list_data_cached (for cache key)
+            request_body = self.build_request_body(params=params, **kwargs)
+        if self.is_get_api():
             api_params = []
-            if isMethodExist(self, "get_request_param"):
-                request_body = self.get_request_param(params=params, **kwargs)
-            elif isMethodExist(self, "get_request_body"):
-                request_body = self.get_request_body(params=params, **kwargs)
-            else:
-                query_params = self.get_all_request_params(request_params=params, **kwargs)
-                request_body = self.process_data_for_request(api_request_params=query_params, params=params, **kwargs)
             for key, value in request_body.items():
                 api_params.append((key, value))
 
-            req_resp = requests.get(url=api_url, params=api_params, headers=request_headers, verify=False)
+            http_method = 'GET'
         else:
-            if isMethodExist(self, "get_request_body"):
-                request_body = self.get_request_body(params=params, **kwargs)
-            else:
-                query_params = self.get_all_request_params(request_params=params, **kwargs)
-                request_body = self.process_data_for_request(api_request_params=query_params, params=params, **kwargs)
+            http_method = 'POST'
 
-            req_resp = requests.post(url=api_url, json=request_body, headers=request_headers, verify=False)
+        requests = import_requests()
+        session = self.get_http_session(api_url)
+        timeout = self.get_call_timeout(params=params, **kwargs)
+        try:
+            if http_method == 'GET':
+                req_resp = session.get(url=api_url, params=api_params, headers=request_headers, verify=False, timeout=timeout)
+            else:
+                req_resp = session.post(url=api_url, json=request_body, headers=request_headers, verify=False, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            logging.error("Source: apis/components/base/base_api_manager.py, Method name: call_api(...) URL: %s - Error: %s" % (api_url, str(e)))
+            error_code = 'API_TIMEOUT' if isinstance(e, requests.exceptions.Timeout) else 'API_REQUEST_FAILED'
+            return self.get_failed_call_api_response(request_body, error_code, str(e), params=params, **kwargs)
 
         return self.handle_response_call_api(request_body, req_resp, params=None, **kwargs)
 
@@ -215,6 +371,80 @@ class BaseAPIManager(BaseManager):
         # return response_data
         raise NotImplemented()
 
+    def fetch_list_data(self, params=None, request_body=None, **kwargs):
+        resp = self.call_api(params=params, request_body=request_body, **kwargs)
+        response_data = self.process_data_for_response(api_response=resp, errorCodes=resp['errorCodes'], params=params, **kwargs)
+        error_info = self.get_api_error_info(resp)
+        return response_data, error_info
+
+    def get_cache_user_key(self, params=None, **kwargs):
+        logged_in_user = (params or {}).get('logged_in_user', None)
+        if logged_in_user is None and (params or {}).get('request', None) is not None:
+            logged_in_user = getattr(params['request'], 'user', None)
+        if logged_in_user is None or not getattr(logged_in_user, 'is_authenticated', False):
+            return 'anonymous'
+        return str(logged_in_user.pk)
+
+    '''
+        Description: This method return cache key of list() response, derived from api_name, method, request body, 
+            request headers and logged in user, so response cached for one user (or credentials) is not served to another.
+        Parameters:
+            1. params (Dic): Controller can share additional data in this dictionary.
+            2. request_body (Dic): request body, built by build_request_body()
+        Returns:    String
+        Exception:  None
+    '''
+    def get_list_cache_key(self, params=None, request_body=None, **kwargs):
+        if request_body is None:
+            request_body = self.build_request_body(params=params, **kwargs)
+        key_data = {'body': request_body, 'headers': self.get_request_headers(**kwargs), 'user': self.get_cache_user_key(params=params, **kwargs)}
+        key_hash = hashlib.md5(json.dumps(key_data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        return 'api_list:%s:%s:%s:%s' % (self.__class__.__name__, self.api_name, 'GET' if self.is_get_api() else 'POST', key_hash)
+
+    def refresh_list_cache(self, cache_key, params=None, request_body=None, refresh_lock_key=None, **kwargs):
+        try:
+            response_data, error_info = self.fetch_list_data(params=params, request_body=request_body, **kwargs)
+            timeout = self.cache_error_timeout if error_info.get('errors', None) else self.cache_timeout
+            if timeout > 0:
+                cache_entry = {'data': response_data, 'error_info': error_info, 'fresh_until': time.time() + timeout}
+                cache.set(cache_key, cache_entry, timeout + self.cache_stale_timeout)
+            return response_data, error_info
+        finally:
+            if refresh_lock_key:  # only the worker which took the lock (cache.add) release it
+                cache.delete(refresh_lock_key)
+
+    def refresh_list_cache_in_background(self, cache_key, params=None, **kwargs):
+        try:
+            self.refresh_list_cache(cache_key, params=params, **kwargs)
+        except Exception as e:
+            logging.info("Path apis/components/base/base_api_manager.py  Class: BaseAPIManager Method: refresh_list_cache_in_background(...)  Error: %s" % (str(e)))
+            logging.info(traceback.format_exc())
+
+    '''
+        Description: This method return list data from cache (key derived from request, see get_list_cache_key), 
+            stale data is served while only one request refresh it in background. On cache miss, concurrent requests 
+            for same key make only one API call (single-flight).
+        Parameters:
+            1. params (Dic): Controller can share additional data in this dictionary.
+        Returns:    tuple of (response_data, error_info)
+        Exception:  None
+    '''
+    def fetch_list_data_cached(self, params=None, **kwargs):
+        request_body = self.build_request_body(params=params, **kwargs)
+        cache_key = self.get_list_cache_key(params=params, request_body=request_body, **kwargs)
+        cache_entry = cache.get(cache_key, None)
+        if cache_entry is not None:
+            refresh_lock_key = cache_key + ':refresh'
+            if cache_entry['fresh_until'] <= time.time() and \
+                    cache.add(refresh_lock_key, True, self.api_connect_timeout + self.api_read_timeout):
+                # own small pool, so a burst of refreshes does not delay deadline-bound fan_out_api_calls()
+                get_cache_refresh_executor().submit(run_in_pool_thread, self.refresh_list_cache_in_background, cache_key, params=params,
+                                                    request_body=request_body, refresh_lock_key=refresh_lock_key, **kwargs)
+            return cache_entry['data'], cache_entry['error_info']
+
+        return single_flight(cache_key, lambda: self.refresh_list_cache(cache_key, params=params, request_body=request_body, **kwargs),
+                             timeout=self.api_connect_timeout + self.api_read_timeout)
+
     def list(self, params=None, **kwargs): # def fetch(self, *args, **kwargs):
         response_data = None
         data_dict={}
@@ -225,11 +455,12 @@ class BaseAPIManager(BaseManager):
             error_info =  { "errors": [], "error_no": 0 }
 
         if not response_data:
-            resp = self.call_api(params=params, **kwargs)
-            response_data = self.process_data_for_response(api_response=resp, errorCodes=resp['errorCodes'], params=params, **kwargs)
-            error_info = self.get_api_error_info(resp)
-            if cache_key and response_data:
-                cache.set(cache_key, response_data)
+            if cache_key or self.cache_timeout <= 0:
+                response_data, error_info = self.fetch_list_data(params=params, **kwargs)
+                if cache_key and response_data:
+                    cache.set(cache_key, response_data)
+            else:
+                response_data, error_info = self.fetch_list_data_cached(params=params, **kwargs)
 
         if not response_data:
             response_data = []
@@ -242,3 +473,85 @@ class BaseAPIManager(BaseManager):
 
         return data_dict
 
+
+
+def get_fan_out_executor():
+    global _fan_out_executor
+    if _fan_out_executor is None:
+        with _http_sessions_lock:
+            if _fan_out_executor is None:
+                _fan_out_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'API_FAN_OUT_MAX_WORKERS', 16),
+                                                       thread_name_prefix='api_fan_out')
+    return _fan_out_executor
+
+
+def get_cache_refresh_executor():
+    global _cache_refresh_executor
+    if _cache_refresh_executor is None:
+        with _http_sessions_lock:
+            if _cache_refresh_executor is None:
+                _cache_refresh_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'API_CACHE_REFRESH_MAX_WORKERS', 2),
+                                                             thread_name_prefix='api_cache_refresh')
+    return _cache_refresh_executor
+
+
+'''
+    Run func in a thread of a pool (fan-out calls, background cache refresh). Pool threads are not requests, so 
+    database connections they opened (e.g. a Manager used by API Manager) are closed like at the end of a request.
+'''
+def run_in_pool_thread(func, *args, deadline_at=None, **kwargs):
+    deadline_token = _call_deadline.set(deadline_at)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _call_deadline.reset(deadline_token)  # thread is reused by next call
+        close_old_connections()
+
+
+'''
+    Description: This function call many API Managers concurrently (bounded thread pool shared by the process), 
+        so response time is the slowest call instead of sum of all calls.
+        e.g. results = fan_out_api_calls({'rates': (rates_manager, params), 'routes': (routes_manager, params)}, deadline=10)
+    Parameters:
+        1. api_calls (Dic): key ==> tuple of (api_manager, params) or (api_manager, params, kwargs)
+        2. deadline (float): seconds allowed for all calls together, None for no deadline. Calls which are not finished 
+            in time are reported as failed (errorCode 'API_TIMEOUT'). A running call cannot be cancelled, it keeps its 
+            pool thread until its HTTP request ends, so timeout of each HTTP request (connect / read) is limited to the 
+            time left before deadline (see BaseAPIManager.get_call_timeout). Read timeout is per socket read and retries 
+            of the session may add time, so a call may still end somewhat after deadline; this is logged.
+        3. method_name (String): method of Manager to call, 'call_api' or 'list'
+    Returns:    Dic, key ==> response of method, failed calls have errors in 'error_info' 
+    Exception:  None
+'''
+def fan_out_api_calls(api_calls, deadline=None, method_name='call_api'):
+    executor = get_fan_out_executor()
+    deadline_at = time.time() + deadline if deadline is not None else None
+    futures = {}
+    for key, api_call in api_calls.items():
+        api_manager, params = api_call[0], api_call[1]
+        kwargs = api_call[2] if len(api_call) > 2 else {}
+        futures[key] = executor.submit(run_in_pool_thread, getattr(api_manager, method_name), params=params, deadline_at=deadline_at, **kwargs)
+
+    wait(list(futures.values()), timeout=deadline)
+
+    results = {}
+    for key, future in futures.items():
+        api_manager = api_calls[key][0]
+        if future.done() and future.exception() is None:
+            results[key] = future.result()
+            continue
+
+        if future.done():
+            error_code, description = 'API_REQUEST_FAILED', str(future.exception())
+        else:
+            error_code, description = 'API_TIMEOUT', 'API call did not finish within %s seconds.' % (deadline)
+            if not future.cancel():
+                logging.warning("Source: apis/components/base/base_api_manager.py, Method name: fan_out_api_calls(...) API: %s - "
+                                "Warning: call is still running after deadline, it holds a pool thread until its request times out" % (api_manager.api_name))
+        logging.error("Source: apis/components/base/base_api_manager.py, Method name: fan_out_api_calls(...) API: %s - Error: %s" % (api_manager.api_name, description))
+        resp = api_manager.get_failed_call_api_response(None, error_code, description)
+        if method_name == 'list':
+            # same error_info as list() (get_api_error_info / getErrorInfo), not the one of call_api()
+            resp = {'data': [], 'count': 0, 'error_info': api_manager.get_api_error_info(resp)}
+        results[key] = resp
+    return results
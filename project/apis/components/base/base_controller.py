@@ -1,3 +1,4 @@
+import itertools
 import json
 import sys
 import logging
@@ -5,32 +6,80 @@ import os
 import traceback
 
 from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
 
 from datetime import datetime, timedelta, date
-from django.db import DataError
+from django.db import DataError, models
+from django.db.models.query import QuerySet, prefetch_related_objects
 from django.forms.models import model_to_dict
-from rest_framework.parsers import MultiPartParser, FileUploadParser
+from django.http import StreamingHttpResponse
+from rest_framework.parsers import JSONParser, MultiPartParser, FileUploadParser
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.generics import GenericAPIView
-from rest_framework import serializers
+from rest_framework import ISO_8601, serializers
+from rest_framework.fields import empty
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
 
 
 from apis.common.utilities.function_utility import getMethodHandler
-from celery.exceptions import ImproperlyConfigured
+from apis.components.base.query_inspector import QueryInspector, QueryBudgetExceeded, get_query_inspector_settings
+from apis.common.utils import json_loads
+from apis.common.utilities.request_timing import get_request_timer, timed_section
 
 from project.constants_status import HTTP_500_INTERNAL_SERVER_ERROR, INTERNAL_WARNING_1004_DATA_NOT_FOUND, \
     INTERNAL_NO_ERROR_1001_SUCCESSFULLY_DONE, INTERNAL_ERROR_1000_INTERNAL_SERVER_ERROR, get_error_message
 
 
 
+class RequestBodyJSONParser(JSONParser):
+    '''
+    JSONParser which reuse JSON body already parsed by BaseController.get_request_body_content(), 
+    so request.data does not parse the body again.
+    '''
+    def parse(self, stream, media_type=None, parser_context=None):
+        django_request = getattr((parser_context or {}).get('request', None), '_request', None)
+        content = getattr(django_request, '_body_content', None)
+        if content is not None:
+            return content
+        return super(RequestBodyJSONParser, self).parse(stream, media_type=media_type, parser_context=parser_context)
+
+
 class BaseController(GenericAPIView):
+    # True: service_create save LIST_OF_PARAMS payload with manager.bulk_save() (batched INSERTs), only if Manager does not 
+    # override create(). Model.save() is not called and pre_save / post_save signals are not sent, and on databases which 
+    # can not return ids from bulk insert (MySQL, SQLite) created objects in response have no id.
+    bulk_create_list = False
+    stream_list_response = False  # True: service_list always stream non paginated results (same as request param stream=true)
+    stream_chunk_size = 2000  # Rows fetched from database and serialized at a time, while streaming
+    auto_related_fields = True  # True: service_list plan select_related / prefetch_related from serializer's nested fields
+    # True: request param debug_queries=true report queries (count and N+1) in response, also allowed if DEBUG
+    debug_queries = getattr(settings, 'DEBUG_QUERIES', False)
+    query_budget = None  # max number of queries per request of this Controller, default is settings.QUERY_INSPECTOR['BUDGET']
+    list_projection = False  # True: service_list fetch rows as dicts (queryset.values) when serializer fields are plain model columns
+    # Serializer fields, whose to_representation() does not change value of (related) model field, for projection. 
+    # Fields which format or coerce value (e.g. BooleanField, DecimalField, DateTimeField) are not projected, 
+    # DateField and UUIDField only with default (ISO 8601 / hex_verbose) format, see is_projection_field().
+    projection_field_types = {
+        serializers.CharField: (models.CharField, models.TextField),
+        serializers.IntegerField: (models.IntegerField, models.AutoField),
+        serializers.FloatField: (models.FloatField,),
+        serializers.DateField: (models.DateField,),
+        serializers.UUIDField: (models.UUIDField,),
+        serializers.PrimaryKeyRelatedField: (models.ForeignKey,),
+        serializers.ReadOnlyField: (models.Field,),
+    }
 
     def __init__(self):
         self.manager = None
         self.api_manager = None
         self.data_source = "FILE"
 
+    def get_parsers(self):
+        parsers = super(BaseController, self).get_parsers()
+        return [RequestBodyJSONParser() if type(parser) is JSONParser else parser for parser in parsers]
+
     def get_serializer_class(self, request=None, params=None, **kwargs):
         if self.serializer_class :
             return self.serializer_class
@@ -71,7 +120,49 @@ class BaseController(GenericAPIView):
             kwargs['additional_params'] = additional_params
             # kwargs['service_method'] = kwargs.get('service_method')
         updated_kwargs = self.event_after_dispatch(request, *args, **kwargs)
-        return super(BaseController, self).dispatch(request, *args, **updated_kwargs)
+        is_debug_queries = self.is_debug_queries(request)
+        is_query_inspector = is_debug_queries or get_query_inspector_settings()['ENABLED']
+        if not is_query_inspector:  # slow queries are logged on every connection, see install_slow_query_logger()
+            return super(BaseController, self).dispatch(request, *args, **updated_kwargs)
+
+        try:
+            with QueryInspector(budget=self.query_budget) as query_inspector:
+                response = super(BaseController, self).dispatch(request, *args, **updated_kwargs)
+        except QueryBudgetExceeded as e:
+            # raised after request is processed, outside of common_method, so it is a server error (HTTP 500) not a 400
+            e.inspector.log_report("%s %s %s" % (self.__class__.__name__, request.method, request.path))
+            logging.error("Path apis/components/base/base_controller.py  Class: BaseController Method: dispatch(...)  Error: %s" % (str(e)))
+            raise
+        self.report_queries(request, response, query_inspector, is_debug_queries)
+        return response
+
+    def is_debug_queries(self, request):
+        if not (self.debug_queries or settings.DEBUG):
+            return False
+        try:
+            return bool(self.to_boolean_value(request.GET.get('debug_queries', False)))
+        except Exception as e:
+            return False
+
+    '''
+        Description: Report queries executed by request (see QueryInspector), in log and in header "X-Query-Count". 
+            If request param debug_queries=true, report is also added in response data (data.query_count, 
+            data.query_report). For streaming response, queries of streamed rows are not counted.
+        Parameters:  
+            1. request : Request object
+            2. response : Response object
+            3. query_inspector : QueryInspector
+            4. is_debug_queries (Boolean): add report in response data
+        Returns:    None
+        Exception:  None
+    '''
+    def report_queries(self, request, response, query_inspector, is_debug_queries=False):
+        query_inspector.log_report("%s %s %s" % (self.__class__.__name__, request.method, request.path))
+        response['X-Query-Count'] = str(query_inspector.query_count)
+        data = getattr(response, 'data', None)
+        if is_debug_queries and isinstance(data, dict) and isinstance(data.get('data', None), dict):
+            data['data']['query_count'] = query_inspector.query_count
+            data['data']['query_report'] = query_inspector.report()
 
     '''
         Description: this method collect request data using request.data and request.query_params
@@ -99,13 +190,39 @@ class BaseController(GenericAPIView):
         Exception:  None
     '''
     def get_request_body_params(self, request):
-        body_unicode = request.body.decode('utf-8')
-        content = json.loads(body_unicode)
+        content = self.get_request_body_content(request)
         if content:
             return content
         else:
             return {}
 
+    def is_form_content_type(self, django_request):
+        content_type = django_request.META.get('CONTENT_TYPE', '').split(';')[0].strip().lower()
+        return content_type.startswith('multipart/') or content_type == 'application/x-www-form-urlencoded'
+
+    '''
+        Description: this method parse JSON request.body, only once per request (parsed content is kept in request).
+            Body of any content type is parsed as JSON (also missing or text/plain), except forms and multipart uploads, 
+            they are not read here, they are parsed by request.data / request.POST.
+        Parameters:  
+            1. request : Request object. 
+        Returns:    parsed content (Dic or List), or None if body is empty, not a JSON or a form
+        Exception:  None
+    '''
+    def get_request_body_content(self, request):
+        django_request = getattr(request, '_request', request)  # rest_framework's Request wraps Django's HttpRequest
+        if not hasattr(django_request, '_body_content'):
+            content = None
+            if not self.is_form_content_type(django_request):
+                try:
+                    if django_request.body:
+                        content = json_loads(django_request.body)
+                except ValueError as e:  # invalid JSON or encoding
+                    logging.info("Path apis/components/base/base_controller.py  Class: BaseController Method: get_request_body_content(...)  Error: %s" % (str(e)))
+                    content = None
+            django_request._body_content = content
+        return django_request._body_content
+
     '''
         Description: this method collect request data using request.GET
         Parameters:  
@@ -166,6 +283,8 @@ class BaseController(GenericAPIView):
                 else:
                     service_method = 'update'
 
+            content = self.get_request_body_content(request)  # parse body before request.data, so it is parsed only once
+
             request_data['logged_in_user'] = request.user
             request_data['query_params'] = self.get_query_params(request)
             params_count = params_count + len(request_data['query_params'])
@@ -182,39 +301,24 @@ class BaseController(GenericAPIView):
             try: #elif request.method == 'POST':
                 params_count = params_count + len(request.POST)
                 request_params.update(request.POST) #request_data.update(request.POST)
-
-                body_unicode = request.body.decode('utf-8')
-                if body_unicode:
-                    content = json.loads(body_unicode)
-                    if content:
-                        if type(content) is list or type(content) is tuple:
-                            params_count = params_count + 1
-                            request_params['LIST_OF_PARAMS'] = content
-                        else:
-                            params_count = params_count + len(content)
-                            request_params.update(content)  # request_data.update(content)
-
-                    request_data['data_source'] = request.POST.get("data_source", 'FILE').upper()
-                    request_data['service_method'] = request.POST.get("service_method", service_method) #'create')
             except Exception as e2:
                 pass
 
-            try: # else:
-                body_unicode = request.body.decode('utf-8')
-                if body_unicode:
-                    content = json.loads(body_unicode)
-                    if content:
+            if content is not None:
+                if content:
+                    if type(content) is list or type(content) is tuple:
+                        params_count = params_count + 1
+                        request_params['LIST_OF_PARAMS'] = content
+                    else:
                         params_count = params_count + len(content)
-                        request_params.update(content) #request_data.update(content)
+                        request_params.update(content)  # request_data.update(content)
 
+                if isinstance(content, dict):
                     request_data['data_source'] = content.get("data_source", 'FILE').upper()
                     request_data['service_method'] = content.get("service_method", service_method) #'update')
-            except Exception as e2:
-                if request.method == 'POST':
-                    try:
-                        pass
-                    except Exception as e3:
-                        pass
+                else:
+                    request_data['data_source'] = request.POST.get("data_source", 'FILE').upper()
+                    request_data['service_method'] = request.POST.get("service_method", service_method) #'create')
 
             if 'service_method' in request_params:
                 request_data['service_method'] = request_params.pop('service_method')
@@ -394,6 +498,9 @@ class BaseController(GenericAPIView):
         try:
             params = kwargs.pop('additional_params')
             service_method_name = "service_" + params['service_method'].lower()
+            request_timer = get_request_timer()
+            if request_timer:
+                request_timer.set_labels(controller=type(self).__name__, service_method=params['service_method'].lower())
 
             is_method_exist, handler = getMethodHandler(self, service_method_name)
             # handler = getattr(self, service_method_name, self.http_method_not_allowed)
@@ -469,7 +576,8 @@ class BaseController(GenericAPIView):
         cls_serializer  = self.get_serializer_class(request=request, params=params, **kwargs)
         if obj:
             serializer_context = params if params else {}
-            result_data = cls_serializer(obj, context=serializer_context).data # self.serializer_class(obj).data
+            with timed_section('serializer'):
+                result_data = cls_serializer(obj, context=serializer_context).data # self.serializer_class(obj).data
             response_code = INTERNAL_NO_ERROR_1001_SUCCESSFULLY_DONE
             response_message = "Retrieved object successfully."
             response_status = status.HTTP_200_OK # status.HTTP_202_ACCEPTED
@@ -482,10 +590,22 @@ class BaseController(GenericAPIView):
         return self.data_wrapper_response(result_data=result_data, response_code=response_code, response_message=response_message, status_code=response_status)
 
     def service_retrieve(self, request, params=None, *args, **kwargs):
-        obj = self.manager.retrieve(kwargs['pk'], params, **kwargs)
+        with timed_section('manager'):
+            obj = self.manager.retrieve(kwargs['pk'], params, **kwargs)
         return  self.obj_to_response(obj, request, params=params, *args, **kwargs)
 
 
+    '''
+        Description: Return True if LIST_OF_PARAMS payload is saved by manager.bulk_save(), i.e. "bulk_create_list" is 
+            enabled and Manager does not override create() (bulk_save does not call it).
+        Parameters:
+            1. params : Parameters
+        Returns:    Boolean
+        Exception:  None
+    '''
+    def is_bulk_create(self, params=None):
+        return self.bulk_create_list and not self.manager.is_create_overridden()
+
     '''
         Description: HTTP default service_method for retrieve data Implementation 
         Parameters:  
@@ -498,15 +618,21 @@ class BaseController(GenericAPIView):
     '''
     def service_create(self, request, params=None, *args, **kwargs):
         if 'request_params' in params and 'LIST_OF_PARAMS' in params['request_params']:
-            service_data = self.get_serializer_data(request, many=True)
-            obj = []
-            for service_data_item in service_data:
-                obj.append(self.manager.create(params, **service_data_item))
+            with timed_section('serializer'):
+                service_data = self.get_serializer_data(request, many=True)
+            with timed_section('manager'):
+                if self.is_bulk_create(params):
+                    obj = self.manager.bulk_save(params, service_data, only_create=True)
+                else:
+                    obj = []
+                    for service_data_item in service_data:
+                        obj.append(self.manager.create(params, **service_data_item))
 
             data_list = {}
             cls_serializer = self.get_serializer_class(request=request, params=params, **kwargs)
             data_list['count'] = len(obj)
-            data_list['data'] =  cls_serializer(obj, context=params, many=True).data  # self.serializer_class(obj).data
+            with timed_section('serializer'):
+                data_list['data'] =  cls_serializer(obj, context=params, many=True).data  # self.serializer_class(obj).data
 
             response_code = INTERNAL_NO_ERROR_1001_SUCCESSFULLY_DONE
             response_message = "%s New object(s) created successfully." % (data_list['count'])
@@ -515,11 +641,14 @@ class BaseController(GenericAPIView):
                                               response_message=response_message,
                                               status_code=status.HTTP_200_OK)
         else:
-            service_data = self.get_serializer_data(request)
-            obj = self.manager.create(params, **service_data)
+            with timed_section('serializer'):
+                service_data = self.get_serializer_data(request)
+            with timed_section('manager'):
+                obj = self.manager.create(params, **service_data)
 
             cls_serializer = self.get_serializer_class(request=request, params=params, **kwargs)
-            result_data = cls_serializer(obj,  context=params ).data # self.serializer_class(obj).data
+            with timed_section('serializer'):
+                result_data = cls_serializer(obj,  context=params ).data # self.serializer_class(obj).data
 
             response_code = INTERNAL_NO_ERROR_1001_SUCCESSFULLY_DONE
             response_message = "New object created successfully."
@@ -546,15 +675,19 @@ class BaseController(GenericAPIView):
             pk_field_vlaue = request_params.get(pk_field_name, None)
 
         if pk_field_vlaue:
-            instance = self.manager.retrieve(id_value=pk_field_vlaue, params=params, **kwargs)    #self.Model.objects.get(pk=pk_field_vlaue)
+            with timed_section('manager'):
+                instance = self.manager.retrieve(id_value=pk_field_vlaue, params=params, **kwargs)    #self.Model.objects.get(pk=pk_field_vlaue)
             # print(request.data)
             
-            service_data = self.get_serializer_data(request, instance=instance, partial=True)
+            with timed_section('serializer'):
+                service_data = self.get_serializer_data(request, instance=instance, partial=True)
             
-            updated_rows = self.manager.update(pk=pk_field_vlaue, params= params, *args,**service_data)
-            obj = self.manager.retrieve(id_value=pk_field_vlaue, params=params, **kwargs)
+            with timed_section('manager'):
+                updated_rows = self.manager.update(pk=pk_field_vlaue, params= params, *args,**service_data)
+                obj = self.manager.retrieve(id_value=pk_field_vlaue, params=params, **kwargs)
             # result_data = model_to_dict(obj)
-            result_data = self.serializer_class(obj).data
+            with timed_section('serializer'):
+                result_data = self.serializer_class(obj).data
             response_code = INTERNAL_NO_ERROR_1001_SUCCESSFULLY_DONE
             response_message = "%s object(s) updated successfully." % (updated_rows)  # 1 row(s) affected
         else:
@@ -624,11 +757,14 @@ class BaseController(GenericAPIView):
 
         result_data_dic = {'result_data': {}, 'updated_rows':0, 'response_code': INTERNAL_WARNING_1004_DATA_NOT_FOUND, 'response_message': "No data found for delete"}
         if pk_field_vlaue:
-            instance = self.manager.retrieve(id_value=pk_field_vlaue, params=params, **kwargs)
-            result_data = self.serializer_class(instance).data
+            with timed_section('manager'):
+                instance = self.manager.retrieve(id_value=pk_field_vlaue, params=params, **kwargs)
+            with timed_section('serializer'):
+                result_data = self.serializer_class(instance).data
             result_data_dic['result_data']=result_data
 
-            updated_rows = self.manager.delete(pk_field_vlaue, params, **kwargs) #.update(pk=pk_field_vlaue, **service_data)
+            with timed_section('manager'):
+                updated_rows = self.manager.delete(pk_field_vlaue, params, **kwargs) #.update(pk=pk_field_vlaue, **service_data)
             result_data_dic['updated_rows'] = updated_rows[0]
 
             result_data_dic['response_code'] = INTERNAL_NO_ERROR_1001_SUCCESSFULLY_DONE
@@ -659,9 +795,12 @@ class BaseController(GenericAPIView):
                     data_list = {'data': data_list, 'count': len(data_list)}
 
             if data_list['data']:
-                if cls_serializer:
+                if data_list.get('projection', False):
+                    result_data = list(data_list['data'])  # rows are already dicts (queryset.values)
+                elif cls_serializer:
                     serializer_context = params
-                    result_data = cls_serializer(data_list['data'], context=serializer_context, many=True).data
+                    with timed_section('serializer'):
+                        result_data = cls_serializer(data_list['data'], context=serializer_context, many=True).data
                 other_data_info['count'] = data_list['count']
 
                 if 'pagination' in data_list and data_list['pagination']:
@@ -700,6 +839,316 @@ class BaseController(GenericAPIView):
                                           response_message=result_data_dic['response_message'], status_code=result_data_dic['response_status'],
                                           other_data_info=result_data_dic['other_data_info'])
 
+    def is_stream_response(self, params=None):
+        request_params = params.get('request_params', {}) if params else {}
+        return bool(self.stream_list_response or self.to_boolean_value(request_params.get('stream', False)))
+
+    def encode_stream_chunk(self, chunk, cls_serializer, params=None, encoder=None):
+        result_data = cls_serializer(chunk, context=params, many=True).data if cls_serializer else chunk
+        return ','.join(encoder.encode(item) for item in result_data)
+
+    '''
+        Description: Helper method for streaming list response, it serialize rows chunk by chunk and yield JSON 
+            in same format as data_wrapper_response(). Count and response message are written at the end. 
+            An error after response is started can not change its status, it is logged and re-raised, so the 
+            server aborts the (truncated) response instead of ending it normally.
+        Parameters:  
+            1. first_content (String): encoded first chunk (see to_streaming_response)
+            2. first_count (Integer): number of rows of first chunk
+            3. rows : iterator of remaining objects
+            4. cls_serializer : class of serializer
+            5. params: dic of params
+            6. error_info: errors of response
+        Returns:    generator of JSON string parts
+        Exception:  None
+    '''
+    def stream_list_content(self, first_content, first_count, rows, cls_serializer, params=None, error_info={}):
+        encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        yield '{"status":true,"status_code":%s,"data":{"result":[' % (status.HTTP_200_OK) + first_content
+        count = first_count
+        try:
+            while True:
+                chunk = list(itertools.islice(rows, self.stream_chunk_size))
+                if not chunk:
+                    break
+                yield ',' + self.encode_stream_chunk(chunk, cls_serializer, params=params, encoder=encoder)
+                count = count + len(chunk)
+        except Exception as e:
+            logging.error("Path apis/components/base/base_controller.py  Class: BaseController Method: stream_list_content(...)  "
+                          "Error: streaming failed after %s row(s), response is truncated: %s" % (count, str(e)))
+            logging.error(traceback.format_exc())
+            raise
+
+        response_message = "Retrieved " + str(count) + " object(s) successfully."
+        yield '],"response_code":%s,"response_message":%s,"count":%s},"errors":%s}' % (
+            INTERNAL_NO_ERROR_1001_SUCCESSFULLY_DONE, encoder.encode(response_message), count, encoder.encode(error_info))
+
+    '''
+        Description: Iterate rows of queryset in chunks of "stream_chunk_size" (queryset.iterator). iterator() ignores 
+            prefetch_related, so lookups are prefetched for each chunk (prefetch_related_objects).
+        Parameters:  
+            1. queryset : QuerySet or list of rows
+        Returns:    iterator of rows
+        Exception:  None
+    '''
+    def get_stream_rows(self, queryset):
+        if not isinstance(queryset, QuerySet):
+            for row in queryset:
+                yield row
+            return
+
+        prefetch_lookups = queryset._prefetch_related_lookups
+        if prefetch_lookups:
+            queryset = queryset.prefetch_related(None)
+        rows = queryset.iterator(chunk_size=self.stream_chunk_size)
+        while True:
+            chunk = list(itertools.islice(rows, self.stream_chunk_size))
+            if not chunk:
+                break
+            if prefetch_lookups:
+                prefetch_related_objects(chunk, *prefetch_lookups)
+            for row in chunk:
+                yield row
+
+    '''
+        Description: Streaming version of to_response(), used for large (non paginated) list. Rows are fetched from 
+            database in chunks (queryset.iterator), so memory stays flat, however many rows are returned.
+        Parameters:  
+            1. request : Request object
+            2. data_list : data return from Manager's list() with 'stream'
+            3. params: dic of params
+            4. cls_serializer : class of serializer
+        Returns:    StreamingHttpResponse
+        Exception:  None
+    '''
+    def to_streaming_response(self, request, data_list, params=None, cls_serializer=None, *args, **kwargs):
+        if cls_serializer == None:
+            cls_serializer = self.get_serializer_class(request=request, params=params, **kwargs)
+        if data_list.get('projection', False):
+            cls_serializer = None  # rows are already dicts (queryset.values)
+        rows = self.get_stream_rows(data_list['data'])
+        # first chunk is fetched and serialized before response is started, so early errors (query, serializer) 
+        # are still returned as a proper error response
+        first_chunk = list(itertools.islice(rows, self.stream_chunk_size))
+        if not first_chunk:
+            return self.to_response(request, {'data': [], 'count': 0}, params, cls_serializer)
+        encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        first_content = self.encode_stream_chunk(first_chunk, cls_serializer, params=params, encoder=encoder)
+
+        content = self.stream_list_content(first_content, len(first_chunk), rows, cls_serializer, params=params)
+        return StreamingHttpResponse(content, status=status.HTTP_200_OK, content_type='application/json')
+
+    '''
+        Description: Build list serializer (without data) once per request, its fields are used to plan the query 
+            (get_projection_fields, get_only_fields, get_related_fields).
+        Parameters:  
+            1. request : Request object
+            2. params: dic of params
+            3. cls_serializer : class of serializer
+        Returns:    object of serializer (fields are built), or None if serializer can not be built without data
+        Exception:  None
+    '''
+    def get_list_serializer(self, request, params=None, cls_serializer=None, **kwargs):
+        if cls_serializer == None:
+            cls_serializer = self.get_serializer_class(request=request, params=params, **kwargs)
+        try:
+            serializer = cls_serializer(context=params)
+            serializer.fields
+        except Exception as e:
+            logging.info("Path apis/components/base/base_controller.py  Class: BaseController Method: get_list_serializer(...)-Error: %s" % (str(e)))
+            return None
+        return serializer
+
+    '''
+        Description: Find model fields for projection mode of list, rows are fetched as dicts (queryset.values) and 
+            returned without serializer. It is possible only when each serializer field is a plain model column i.e. 
+            field type is in "projection_field_types", its source is same as name, without custom to_representation 
+            and without inner fields.
+        Parameters:  
+            1. request : Request object
+            2. params: dic of params
+            3. cls_serializer : class of serializer
+            4. serializer : serializer built by get_list_serializer(), it is built if not provided
+        Returns:    list of field names, or None if projection is not possible
+        Exception:  None
+    '''
+    def get_projection_fields(self, request, params=None, cls_serializer=None, serializer=None, **kwargs):
+        model = getattr(self.manager, 'Model', None)
+        if not self.list_projection or model is None:
+            return None
+        if serializer is None:
+            serializer = self.get_list_serializer(request, params, cls_serializer, **kwargs)
+        if serializer is None or type(serializer).to_representation is not serializers.Serializer.to_representation:
+            return None
+        serializer_fields = serializer.fields
+        if not serializer_fields or getattr(serializer, 'inner_fields', None):
+            return None
+
+        projection_fields = []
+        for field_name, field in serializer_fields.items():
+            if field.write_only:
+                continue
+            if field.source != field_name:
+                return None
+            try:
+                model_field = model._meta.get_field(field_name)
+            except FieldDoesNotExist:
+                return None
+            if not self.is_projection_field(field, model_field):
+                return None
+            projection_fields.append(field_name)
+        return projection_fields or None
+
+    '''
+        Description: Check output of serializer field is same as value of model field (fetched by queryset.values), 
+            i.e. to_representation() of field is a no-op: field type is in "projection_field_types" (exact type, 
+            not a subclass), without format (DateField: ISO 8601, UUIDField: hex_verbose) or pk_field.
+        Parameters:  
+            1. field : serializer field
+            2. model_field : model field of same name
+        Returns:    Boolean
+        Exception:  None
+    '''
+    def is_projection_field(self, field, model_field):
+        model_field_types = self.projection_field_types.get(type(field))
+        if model_field_types is None or not isinstance(model_field, model_field_types):
+            return False
+        if not getattr(model_field, 'concrete', False) or model_field.many_to_many or \
+                (model_field.is_relation and not isinstance(field, serializers.PrimaryKeyRelatedField)):
+            return False
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is not None:
+            return False
+        if isinstance(field, serializers.DateField):
+            output_format = getattr(field, 'format', empty)
+            if output_format is empty:
+                output_format = api_settings.DATE_FORMAT
+            if isinstance(model_field, models.DateTimeField) or \
+                    (output_format is not None and (not isinstance(output_format, str) or output_format.lower() != ISO_8601)):
+                return False  # None: date object is rendered in ISO 8601
+        if isinstance(field, serializers.UUIDField) and field.uuid_format != 'hex_verbose':
+            return False
+        return True
+
+    '''
+        Description: Find model fields, which are required by serializer i.e. source of each serializer field, 
+            so Manager loads only these columns (queryset.only()). Returns None if serializer may need whole object 
+            e.g. SerializerMethodField (source "*"), property of model or custom to_representation.
+        Parameters:  
+            1. request : Request object
+            2. params: dic of params
+            3. cls_serializer : class of serializer
+            4. serializer : serializer built by get_list_serializer(), it is built if not provided
+        Returns:    list of field names, or None
+        Exception:  None
+    '''
+    def get_only_fields(self, request, params=None, cls_serializer=None, serializer=None, **kwargs):
+        model = getattr(self.manager, 'Model', None)
+        if model is None:
+            return None
+        if serializer is None:
+            serializer = self.get_list_serializer(request, params, cls_serializer, **kwargs)
+        if serializer is None or type(serializer).to_representation is not serializers.Serializer.to_representation:
+            return None
+        serializer_fields = serializer.fields
+        if not serializer_fields:
+            return None
+
+        only_fields = set()
+        for field_name, field in serializer_fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*':
+                return None
+            attr_name = field.source.split('.')[0]
+            try:
+                model_field = model._meta.get_field(attr_name)
+            except FieldDoesNotExist:
+                return None
+            if getattr(model_field, 'concrete', False) and not model_field.many_to_many:
+                only_fields.add(attr_name)
+
+        concrete_fields = [field.name for field in model._meta.concrete_fields]
+        if not only_fields or only_fields.issuperset(concrete_fields):
+            return None
+        return [field_name for field_name in concrete_fields if field_name in only_fields]
+
+    '''
+        Description: Plan select_related (foreign-key / one-to-one) and prefetch_related (reverse foreign-key / 
+            many-to-many) for list, from nested serializers, related fields and dotted sources of serializer 
+            (only requested "fields" / "inner_fields"), so related objects are not fetched row by row.
+        Parameters:  
+            1. request : Request object
+            2. params: dic of params
+            3. cls_serializer : class of serializer
+            4. serializer : serializer built by get_list_serializer(), it is built if not provided
+        Returns:    tuple of (select_related_fields, prefetch_related_fields)
+        Exception:  None
+    '''
+    def get_related_fields(self, request, params=None, cls_serializer=None, serializer=None, **kwargs):
+        model = getattr(self.manager, 'Model', None)
+        if not self.auto_related_fields or model is None:
+            return [], []
+        if serializer is None:
+            serializer = self.get_list_serializer(request, params, cls_serializer, **kwargs)
+        if serializer is None:
+            return [], []
+
+        select_related_fields = set()
+        prefetch_related_fields = set()
+        self.plan_related_fields(model, serializer.fields, select_related_fields, prefetch_related_fields)
+        return sorted(select_related_fields), sorted(prefetch_related_fields)
+
+    def plan_related_fields(self, model, serializer_fields, select_related_fields, prefetch_related_fields, prefix='', is_prefetch=False):
+        for field_name, field in serializer_fields.items():
+            if field.write_only or field.source == '*':
+                continue
+            nested_fields = None
+            if isinstance(field, serializers.ListSerializer):
+                if isinstance(field.child, serializers.Serializer):
+                    nested_fields = field.child.fields
+            elif isinstance(field, serializers.Serializer):
+                nested_fields = field.fields
+            # PrimaryKeyRelatedField needs only foreign-key column, not related object
+            need_related_object = isinstance(field, (serializers.BaseSerializer, serializers.ManyRelatedField)) or \
+                                  (isinstance(field, serializers.RelatedField) and not isinstance(field, serializers.PrimaryKeyRelatedField))
+            attr_names = field.source.split('.')
+            if not need_related_object:
+                attr_names = attr_names[:-1]
+
+            current_model = model
+            path = prefix
+            in_prefetch = is_prefetch
+            for attr_name in attr_names:
+                model_field = self.get_model_relation(current_model, attr_name)
+                if model_field is None:
+                    break
+                path = path + '__' + attr_name if path else attr_name
+                if model_field.many_to_many or model_field.one_to_many:
+                    in_prefetch = True
+                if in_prefetch:
+                    prefetch_related_fields.add(path)
+                else:
+                    select_related_fields.add(path)
+                current_model = model_field.related_model
+            else:
+                if nested_fields and attr_names:
+                    self.plan_related_fields(current_model, nested_fields, select_related_fields, prefetch_related_fields,
+                                             prefix=path, is_prefetch=in_prefetch)
+
+    def get_model_relation(self, model, attr_name):
+        try:
+            model_field = model._meta.get_field(attr_name)
+        except FieldDoesNotExist:
+            # reverse relation is accessed by accessor name e.g. "book_set"
+            model_field = None
+            for related_object in model._meta.related_objects:
+                if related_object.get_accessor_name() == attr_name:
+                    model_field = related_object
+                    break
+        if model_field is None or not model_field.is_relation or model_field.related_model is None:
+            return None
+        return model_field
+
     def event_api_list_filters(self):
         pass
     '''
@@ -714,7 +1163,32 @@ class BaseController(GenericAPIView):
     '''
     def service_list(self, request, params=None, *args, **kwargs):
         manager = self.api_manager if params.get('data_source', "File").upper() == 'API' else self.manager
-        data_list = manager.list(params, **kwargs)
+        if manager is self.manager:
+            serializer = self.get_list_serializer(request, params, **kwargs) if getattr(self.manager, 'Model', None) else None
+            projection_fields = self.get_projection_fields(request, params, serializer=serializer, **kwargs) if serializer else None
+            if projection_fields:
+                kwargs['projection_fields'] = projection_fields
+            elif serializer is not None:
+                only_fields = self.get_only_fields(request, params, serializer=serializer, **kwargs)
+                if only_fields:
+                    kwargs['only_fields'] = only_fields
+                select_related_fields, prefetch_related_fields = self.get_related_fields(request, params, serializer=serializer, **kwargs)
+                if select_related_fields:
+                    kwargs['select_related_fields'] = select_related_fields
+                if prefetch_related_fields:
+                    kwargs['prefetch_related_fields'] = prefetch_related_fields
+            if self.is_stream_response(params):
+                kwargs['stream'] = True
+        with timed_section('manager'):
+            data_list = manager.list(params, **kwargs)
+        kwargs.pop('projection_fields', None)
+        kwargs.pop('only_fields', None)
+        kwargs.pop('select_related_fields', None)
+        kwargs.pop('prefetch_related_fields', None)
+        kwargs.pop('stream', None)
+
+        if data_list and data_list.get('stream', False):
+            return self.to_streaming_response(request, data_list, params, *args, **kwargs)
         return self.to_response(request, data_list, params, *args, **kwargs)
 
 
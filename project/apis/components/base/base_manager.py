@@ -1,14 +1,139 @@
+import datetime
+import hashlib
+import inspect
+import itertools
+import json
 import logging
 import traceback
-import uuid
+from contextvars import ContextVar
 
 from django.apps import apps
-from django.db.models import Subquery
-from django.core.paginator import Paginator
+from django.conf import settings
+from django.db.models import F, Q, Subquery
+from django.db.models.query import QuerySet
+from django.core.cache import cache
+from django.core.paginator import Paginator, EmptyPage
+from django.core.serializers.json import DjangoJSONEncoder
 
 from apis.common.utils import find_in_dic_or_list, Base64EncodeDecode
+from apis.components.base.PaginatedRawQuerySet import PaginatedRawQuerySet
 from django.db import connection, transaction
 
+COUNT_STRATEGY_EXACT = 'exact'
+COUNT_STRATEGY_CACHED = 'cached'
+COUNT_STRATEGY_ESTIMATED = 'estimated'
+
+_filter_session_var = ContextVar('filter_session', default=None)
+_log_sql_counter = itertools.count()
+
+
+'''
+    Description: Mark a Manager's method as filter of request parameter "param_name" (default: name of method without 
+        "filter_" prefix), see BaseModelManager.get_filter_dispatch_table().
+        e.g.    @request_filter
+                def filter_city(self, value, queryset, request_params=None): ...
+    Parameters:
+        1. param_name (String): name of request parameter
+    Returns:    decorator
+    Exception:  None
+'''
+def request_filter(param_name=None):
+    def decorator(func):
+        name = param_name if isinstance(param_name, str) else None
+        if name is None:
+            name = func.__name__[len('filter_'):] if func.__name__.startswith('filter_') else func.__name__
+        func.request_filter_param = name
+        return func
+    if callable(param_name):  # used without arguments i.e. @request_filter
+        return decorator(param_name)
+    return decorator
+
+
+'''
+    Scratch data shared between filters of a single apply_filters() call. Session is stored in a context variable 
+    (not in the Manager, which is shared by all requests, nor in request parameters) and discarded when 
+    apply_filters() returns.
+'''
+class FilterSession(dict):
+    pass
+
+
+'''
+    Paginator which use total count calculated by Manager (see BaseModelManager.get_total_count), 
+    instead of running its own COUNT(*). If count is not exact, pages beyond the estimated num_pages are allowed, 
+    page is not clamped to the count and one extra row is fetched to know if there is a next page (has_more_rows).
+'''
+class ListPaginator(Paginator):
+
+    def __init__(self, object_list, per_page, count=None, is_exact_count=True, **kwargs):
+        super(ListPaginator, self).__init__(object_list, per_page, **kwargs)
+        self.is_exact_count = is_exact_count
+        if count is not None:
+            self.count = count
+
+    def validate_number(self, number):
+        try:
+            return super(ListPaginator, self).validate_number(number)
+        except EmptyPage:
+            if self.is_exact_count or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        if self.is_exact_count:
+            page = super(ListPaginator, self).page(number)
+            page.has_more_rows = page.has_next()
+            return page
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(self.object_list[bottom:bottom + self.per_page + 1])
+        page = self._get_page(object_list[:self.per_page], number, self)
+        page.has_more_rows = len(object_list) > self.per_page
+        return page
+
+
+'''
+    Message of BaseModelManager.log_sql(), SQL is compiled (str(queryset.query)) only when message is written by 
+    a handler, not when record is dropped by logger / handler level.
+'''
+class LazySQLMessage(object):
+
+    def __init__(self, queryset, msg=' ==> ', params=None, **kwargs):
+        self.queryset = queryset
+        self.msg = msg
+        self.params = params
+        self.kwargs = kwargs
+
+    def __str__(self):
+        try:
+            msg_query = ""
+            if self.params and 'service_method' in self.params:
+                msg_query = msg_query + 'params[service_method]: %s' % (self.params['service_method'])
+            if 'service_method' in self.kwargs:
+                msg_query = msg_query + '    kwargs[service_method]: %s' % (self.kwargs['service_method'])
+            sql_query = str(self.queryset.query)
+            sql_query = sql_query[sql_query.find("FROM") + len("FROM"):] if "FROM" in sql_query else ""
+            if self.msg:
+                msg_query = msg_query + ' ' + self.msg + ' SELECT * FROM ' + sql_query
+            else:
+                msg_query = msg_query + ' ==> SELECT * FROM ' + sql_query
+            return msg_query
+        except Exception as e:
+            return 'log_sql Error: %s' % (str(e))
+
+
+'''
+    JSON encoder of keyset pagination cursors. Unlike DjangoJSONEncoder, datetime / time keep microseconds, 
+    otherwise rows with same (truncated) value are repeated or skipped between pages.
+'''
+class KeysetCursorEncoder(DjangoJSONEncoder):
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super(KeysetCursorEncoder, self).default(o)
+
+
 class BaseManager(object):
 
     def __init__(self):
@@ -99,8 +224,19 @@ class BaseModelManager(BaseManager):
         Returns: None
         Exception: None
     '''
+    count_strategy = COUNT_STRATEGY_EXACT  # One of 'exact', 'cached' or 'estimated' (COUNT_STRATEGY_*)
+    count_cache_timeout = 300  # Seconds, used by 'cached' count strategy
+    count_estimate_min = 1000  # 'estimated' count strategy fall back to exact count below this number of rows
+    # Request parameters which are not filters
+    reserved_filter_params = frozenset(['order_by', 'service_method', 'fields', 'page', 'page_size', 'page_after', 'page_before',
+                                        'with_count', 'stream', 'debug_queries', 'logged_in_user', 'filter_session_key'])
+    reject_unknown_filters = False  # True: raise ValueError for request parameters without filter_<name> method
+    bulk_batch_size = 1000  # Default batch size of bulk_save()
+    # "filter_*" methods which are hooks or helpers, not filters of request parameters
+    non_filter_methods = frozenset(['filter_startfiltering', 'filter_endfiltering', 'filter_on_model'])
+    sql_log_sample_rate = None  # log_sql() writes 1 in N queries, None: settings.SQL_LOG_SAMPLE_RATE (default 1)
+
     def __init__(self, app_name, model_name):
-        self.context = {}
         if app_name==None or model_name == None:
             self.Model = None
         else:
@@ -320,7 +456,7 @@ class BaseModelManager(BaseManager):
             Remember that, generally this search_key is a name of nested field in Serializer
         Parameters: None
         Returns:    object of Manager
-        Exception:  None
+        Exception:  ManagerNotRegistered (LookupError)
     '''
     def get_manager(self, search_key):
         from apis.components.factories.managers_factory import ManagersFactory
@@ -456,6 +592,118 @@ class BaseModelManager(BaseManager):
         return  self.Model.objects.get(id = pk), updated_rows
 
 
+    def event_before_bulk_create(self, params=None, rows=None):
+        updated_rows = []
+        for row in rows:
+            params, args, updated_row = self.event_before_create(params, **row)
+            updated_rows.append(updated_row)
+        return params, updated_rows
+
+    def event_before_bulk_update(self, params=None, rows=None):
+        updated_rows = []
+        for row in rows:
+            params, args, updated_row = self.event_before_update(row['id'], params, **row)
+            updated_rows.append(updated_row)
+        return params, updated_rows
+
+    '''
+        Description: Return True if Manager (or one of its parents) override create(), bulk_save() does not call it.
+        Parameters:  None
+        Returns:    Boolean
+        Exception:  None
+    '''
+    def is_create_overridden(self):
+        return type(self).create is not BaseModelManager.create
+
+    '''
+        Description: This service-method create/update many rows of Model in batches, in a single transaction. 
+            Rows having 'id' are updated (bulk_update), others are inserted (bulk_create). Nested objects (dict values)
+            are grouped per field and saved by their own Manager's bulk_save(), before the rows.
+            event_before_bulk_create/event_before_bulk_update are called once per batch of rows, by default they call 
+            event_before_create/event_before_update for each row.
+            Note: create() / update() of Manager and Model.save() are not called, and pre_save / post_save signals are 
+            not sent (e.g. for GenericSystemSettings call bump_settings_version() after it).
+        Parameters:  
+            1. params (Dic): Controller can share additional data in this dictionary.
+            2. rows (List): list of Dic, key-value data of each row
+            3. batch_size (int): number of rows per INSERT/UPDATE statement, default is "bulk_batch_size"
+            4. only_create (Boolean): if True, all rows are inserted (same as create())
+            5. require_ids (Boolean): if True, returned objects must have primary-key. For databases which can not return 
+                ids from bulk insert (e.g. MySQL) rows are inserted one by one with save() (still in single transaction, 
+                signals are sent), so it should be used only when ids are needed e.g. nested objects.
+        Returns:    List of objects of Model (in order of rows)
+        Exception:  None
+    '''
+    def bulk_save(self, params=None, rows=None, batch_size=None, only_create=False, require_ids=False, **kwargs):
+        rows = [dict(row) for row in rows] if rows else []
+        if not rows:
+            return []
+        batch_size = batch_size if batch_size else self.bulk_batch_size
+
+        objs = [None] * len(rows)
+        with transaction.atomic():
+            self.bulk_save_nested_objects(params, rows, batch_size=batch_size, only_create=only_create)
+
+            create_indexes = []
+            update_indexes = []
+            for idx, row in enumerate(rows):
+                if not only_create and row.get('id', None):
+                    update_indexes.append(idx)
+                else:
+                    create_indexes.append(idx)
+
+            if create_indexes:
+                params, create_rows = self.event_before_bulk_create(params, [rows[idx] for idx in create_indexes])
+                for idx, obj in zip(create_indexes, self.bulk_create_rows(create_rows, batch_size=batch_size, require_ids=require_ids)):
+                    objs[idx] = obj
+
+            if update_indexes:
+                params, update_rows = self.event_before_bulk_update(params, [rows[idx] for idx in update_indexes])
+                for idx, obj in zip(update_indexes, self.bulk_update_rows(update_rows, batch_size=batch_size)):
+                    objs[idx] = obj
+
+        return objs
+
+    def bulk_save_nested_objects(self, params, rows, batch_size=None, only_create=False):
+        nested_rows = {}
+        for row in rows:
+            for key, value in row.items():
+                if isinstance(value, dict):
+                    nested_rows.setdefault(key, []).append(row)
+
+        for key, parent_rows in nested_rows.items():
+            manager = self.get_manager(key)
+            inner_objs = manager.bulk_save(params, [row[key] for row in parent_rows], batch_size=batch_size,
+                                           only_create=only_create, require_ids=True)
+            for row, inner_obj in zip(parent_rows, inner_objs):
+                row[key] = inner_obj
+
+    def bulk_create_rows(self, rows, batch_size=None, require_ids=False):
+        objs = [self.Model(**row) for row in rows]
+        features = connection.features
+        can_return_ids = getattr(features, 'can_return_rows_from_bulk_insert', getattr(features, 'can_return_ids_from_bulk_insert', False))
+        if require_ids and not can_return_ids:
+            for obj in objs:
+                obj.save(force_insert=True)
+            return objs
+        return self.Model.objects.bulk_create(objs, batch_size=batch_size)
+
+    def bulk_update_rows(self, rows, batch_size=None):
+        objs = [self.Model(**row) for row in rows]
+        if hasattr(self.Model.objects, 'bulk_update'):
+            # bulk_update() set same fields for all objects, so group rows by their fields
+            objs_by_fields = {}
+            for obj, row in zip(objs, rows):
+                field_names = tuple(sorted(key for key in row.keys() if key != 'id'))
+                objs_by_fields.setdefault(field_names, []).append(obj)
+            for field_names, grouped_objs in objs_by_fields.items():
+                if field_names:
+                    self.Model.objects.bulk_update(grouped_objs, field_names, batch_size=batch_size)
+        else:
+            for row in rows:
+                self.Model.objects.filter(id=row['id']).update(**{key: value for key, value in row.items() if key != 'id'})
+        return objs
+
     '''
         Description: This service-method update the Model into database.
         Parameters:  
@@ -515,6 +763,7 @@ class BaseModelManager(BaseManager):
         Returns:    queryset after add filter
         Exception:  None
     '''
+    @request_filter
     def filter_xyz(self, value, queryset, request_params=None):
         return queryset
 
@@ -528,11 +777,18 @@ class BaseModelManager(BaseManager):
     '''
     def filter_startfiltering(self,  queryset, request_params=None):
         if request_params:
-            filter_session_key = uuid.uuid1()
-            request_params['filter_session_key'] = filter_session_key
-            self.context[filter_session_key] = {}
+            _filter_session_var.set(FilterSession())
         return queryset
 
+    '''
+        Description: This method return filter session (Dic) of current apply_filters() call, filters can share data using it.
+        Parameters: None
+        Returns:    object of FilterSession or None (if called outside of filters)
+        Exception:  None
+    '''
+    def get_filter_session(self):
+        return _filter_session_var.get()
+
     '''
         Description: This is will call after all filters, you can say this is lst filter method.
         Parameters:   
@@ -561,33 +817,83 @@ class BaseModelManager(BaseManager):
         return queryset
 
     def event_before_filter(self, name, value, queryset, request_params=None):
-        if name not in ['order_by', 'service_method', 'fields', 'page', 'page_size', 'logged_in_user', 'filter_session_key']:
+        if name not in self.reserved_filter_params:
             return queryset
         else:
             return None
-    #def filter_domain_name(self, value, queryset, request_params=None):
-    def clear_filter_session(self, query_params):
+
+    '''
+        Description: This method return dispatch-table of filters i.e. {'xyz': 'filter_xyz', ...}. The table is build 
+            once per Manager's class (on first use), so apply_filters() does not need reflection on every request.
+            Filters are methods marked with @request_filter, and (for existing Managers) unmarked "filter_<param>" 
+            methods which can be called like a filter i.e. (self, value, queryset, request_params), whatever names of 
+            parameters are. Hooks (non_filter_methods e.g. filter_startfiltering, filter_on_model) are never called for 
+            request parameters, other "filter_<param>" methods with different arity are skipped with a warning.
+        Parameters: None
+        Returns:    Dic of param name and filter method name
+        Exception:  None
+    '''
+    @classmethod
+    def get_filter_dispatch_table(cls):
+        dispatch_table = cls.__dict__.get('_filter_dispatch_table', None)
+        if dispatch_table is None:
+            dispatch_table = {}
+            for attr_name in dir(cls):
+                attr = getattr(cls, attr_name, None)
+                if not callable(attr):
+                    continue
+                param_name = getattr(attr, 'request_filter_param', None)
+                if param_name is None and attr_name.startswith('filter_') and attr_name not in cls.non_filter_methods:
+                    if cls.is_filter_signature(attr):
+                        param_name = attr_name[len('filter_'):]
+                    else:
+                        logging.warning("Path apis/components/base/base_manager.py  Class: %s Method: get_filter_dispatch_table()  "
+                                        "Warning: %s() is not a filter (it does not accept value, queryset, request_params), "
+                                        "request parameter '%s' is not filtered by it" % (cls.__name__, attr_name, attr_name[len('filter_'):]))
+                if param_name is not None:
+                    dispatch_table[param_name] = attr_name
+            cls._filter_dispatch_table = dispatch_table
+        return dispatch_table
+
+    @staticmethod
+    def is_filter_signature(method):
         try:
-            if 'filter_session_key' in query_params:
-                filter_session_key = query_params['filter_session_key']
-                if filter_session_key in self.context:
-                    del (self.context[filter_session_key])
-        except Exception as e:
-            pass
+            inspect.signature(method).bind(None, None, None, None)  # self, value, queryset, request_params
+        except (TypeError, ValueError):
+            return False
+        return True
+
+    #def filter_domain_name(self, value, queryset, request_params=None):
+    def clear_filter_session(self, query_params=None):
+        _filter_session_var.set(None)
+
     def apply_filters(self, queryset, query_params=None, method='list', select_related_fields=[], **kwargs):
         filter_dict = {}
+        filter_session_token = _filter_session_var.set(None)  # apply_filters() may be called by filter of another Manager
         try:
             queryset = self.filter_startfiltering(queryset, request_params=query_params)
             if query_params:
-                for query_param_key in query_params.keys() :
-                    q = self.event_before_filter(name=query_param_key, value=query_params[query_param_key], queryset=queryset, request_params=query_params)
-                    if q : #query_param_key not in ['order_by', 'service_method', 'page', 'page_size', 'logged_in_user']:
+                dispatch_table = self.get_filter_dispatch_table()
+                # event_before_filter is called for each param, only if Manager has its own implementation
+                is_filter_event = type(self).event_before_filter is not BaseModelManager.event_before_filter
+                unknown_params = []
+                for query_param_key in list(query_params.keys()):
+                    if is_filter_event:
+                        q = self.event_before_filter(name=query_param_key, value=query_params[query_param_key], queryset=queryset, request_params=query_params)
+                        if q is None:
+                            continue
                         queryset = q
-                        if hasattr(self.__class__, 'filter_%s' % (query_param_key)) and \
-                                callable(getattr(self.__class__, 'filter_%s' % (query_param_key))):
-                            queryset = getattr(self, 'filter_%s' % (query_param_key))(query_params[query_param_key], queryset, query_params)
-                        # else:
-                        #     filter_dict[query_param_key] = query_params[query_param_key]
+                    elif query_param_key in self.reserved_filter_params:
+                        continue
+
+                    filter_method_name = dispatch_table.get(query_param_key, None)
+                    if filter_method_name:
+                        queryset = getattr(self, filter_method_name)(query_params[query_param_key], queryset, query_params)
+                    elif self.reject_unknown_filters:
+                        unknown_params.append(query_param_key)
+
+                if unknown_params:
+                    raise ValueError("Unknown filter parameter(s): %s" % (', '.join(unknown_params)))
 
                 if filter_dict:
                     queryset = queryset.filter(**filter_dict)
@@ -595,12 +901,12 @@ class BaseModelManager(BaseManager):
             queryset = self.filter_endfiltering(queryset, request_params=query_params)
 
             queryset = self.queryset_sorting(queryset, query_params=query_params, method=method, **kwargs)
-            self.clear_filter_session(query_params)
             return queryset
         except Exception as e:
-            self.clear_filter_session(query_params)
             e.args = (e.args if e.args else tuple()) + ('Error in filters',)
             raise    # re-raise current exception
+        finally:
+            _filter_session_var.reset(filter_session_token)
 
 
     '''
@@ -609,61 +915,95 @@ class BaseModelManager(BaseManager):
             1. query_params (Dic): you can provides order_by fields in this dictionary. 
             2. method (String): when this method auto call, can you be identified by your service_method name.
             3. select_related_fields (List): parameters for Model.objects.select_related()
-            4. kwargs (**):  additional parameters for search objects of Model from database. (Not used till Now)
+            4. only_fields (List): load only these fields of Model from database i.e. Model.objects.only()
+            5. prefetch_related_fields (List): parameters for Model.objects.prefetch_related()
+            6. kwargs (**):  additional parameters for search objects of Model from database. (Not used till Now)
         Returns:    queryset  
         Exception:  None
     '''
-    def get_queryset(self, query_params=None, method='list', select_related_fields=[], **kwargs):
+    def get_queryset(self, query_params=None, method='list', select_related_fields=[], only_fields=None, prefetch_related_fields=None, **kwargs):
         if select_related_fields:
-            queryset = self.Model.objects.select_related(select_related_fields)
+            queryset = self.Model.objects.select_related(*select_related_fields)
         else:
             queryset = self.Model.objects.all()
-        return self.apply_filters(queryset, query_params, method, select_related_fields, **kwargs)
-
+        if prefetch_related_fields:
+            queryset = queryset.prefetch_related(*prefetch_related_fields)
+        queryset = self.apply_filters(queryset, query_params, method, select_related_fields, **kwargs)
+        if only_fields:
+            queryset = self.apply_only_fields(queryset, only_fields)
+        return queryset
 
+    '''
+        Description: Restrict columns of SELECT to "only_fields" (queryset.only()). Primary key, ordering fields 
+            (used by keyset cursor) and select_related fields are always loaded. 
+        Parameters: 
+            1. queryset : filtered and sorted queryset
+            2. only_fields (List): names of model fields
+        Returns:    queryset  
+        Exception:  None
+    '''
+    def apply_only_fields(self, queryset, only_fields):
+        if not isinstance(queryset, QuerySet) or queryset._fields is not None:
+            return queryset
+        select_related = queryset.query.select_related
+        if select_related is True:
+            return queryset
+        load_fields = set(field_name.split('__')[0] for field_name in only_fields)
+        load_fields.add(queryset.model._meta.pk.name)
+        if isinstance(select_related, dict):
+            load_fields.update(select_related.keys())
+        for order_field in list(queryset.query.order_by) or list(queryset.model._meta.ordering):
+            if isinstance(order_field, str) and order_field != '?':
+                field_name = order_field.lstrip('-').split('__')[0]
+                if field_name != 'pk':
+                    load_fields.add(field_name)
+        return queryset.only(*load_fields)
+
+
+    '''
+        Description: Log SQL of queryset (at INFO level). It is lazy, SQL is compiled only if record is written,
+            and sampled, only 1 in "sql_log_sample_rate" calls is logged. For logging of slow queries with their 
+            execution time see settings.SQL_LOG_SLOW_MS (apis/components/base/query_inspector.py).
+        Parameters:
+            1. queryset : queryset
+            2. msg (String): message written before SQL
+            3. params (Dic): params of service_method
+        Returns:    None
+        Exception:  None
+    '''
     def log_sql(self, queryset, msg=' ==> ', params=None, **kwargs):
-        try:
-            msg_query = ""
-            if 'service_method' in params:
-                msg_query = msg_query + 'params[service_method]: %s' % (params['service_method'])
-            if 'service_method' in kwargs:
-                msg_query = msg_query + '    kwargs[service_method]: %s' % (kwargs['service_method'])
-            sql_query = str(queryset.query)
-            sql_parts = sql_query.split("FROM")
-            del (sql_parts[0])
-            sql_query = "FROM".join(sql_parts)
-            # sql_query = sql_query.split("FROM")[1]
-            if msg:
-                msg_query = msg_query + ' '+ msg + ' SELECT * FROM ' + sql_query
-            else:
-                msg_query = msg_query + ' ==> SELECT * FROM ' + sql_query
-            logging.info(msg_query)
-        except Exception as e:
-            pass
+        if not logging.getLogger().isEnabledFor(logging.INFO):
+            return
+        sample_rate = self.sql_log_sample_rate if self.sql_log_sample_rate is not None else getattr(settings, 'SQL_LOG_SAMPLE_RATE', 1)
+        if sample_rate > 1 and next(_log_sql_counter) % sample_rate != 0:
+            return
+        logging.info("%s", LazySQLMessage(queryset, msg, params, **kwargs))
 
     '''
         Description: This is a service-method use for retrieve list of data (with pagination data) from database 
             based on different-criteria. 
         Parameters:  
-            1. params (Dic): Controller can share additional data in this dictionary.
-            2. kwargs (**):  additional parameters for search data
+            1. queryset : filtered and sorted queryset
+            2. query_params (Dic): pagination parameters (page, page_size, page_after, page_before, with_count)
+            3. stream (Boolean): if True, non paginated queryset is returned without evaluating it (and without count), 
+                so Controller can stream rows in chunks
         Returns:    list of object
         Exception:  None
     '''
-    def list_by_queryset(self, queryset, query_params):
-        if 'page_size' in query_params or 'page' in query_params :
+    def list_by_queryset(self, queryset, query_params, stream=False):
+        if ('page_after' in query_params or 'page_before' in query_params) and isinstance(queryset, QuerySet):
+            result = self.list_by_keyset(queryset, query_params)
+        elif 'page_size' in query_params or 'page' in query_params :
             items_per_page = int(query_params.get('page_size', 10))
             current_page = int(query_params.get('page', 1))
 
-            paginator = Paginator(queryset, items_per_page)
+            total_count, count_strategy = self.get_total_count(queryset, query_params)
+            paginator = ListPaginator(queryset, items_per_page, count=total_count, is_exact_count=count_strategy != COUNT_STRATEGY_ESTIMATED)
             page = paginator.page(current_page)
             objects = page.object_list  # len(paginator(current_page).object_list
 
-            total_count = paginator.count #(items_per_page * current_page + 1) + len(objects) #paginator(current_page).object_list)
             previous_url = False
-            next_url = False
-            if (current_page * items_per_page) < total_count:
-                next_url = True
+            next_url = page.has_more_rows
             if current_page > 1:
                 previous_url = True
 
@@ -676,18 +1016,274 @@ class BaseModelManager(BaseManager):
                                     'current_page': current_page,
                                     'items_per_page': items_per_page,
                                     'next_url': next_url,
-                                    'previous_url':previous_url
+                                    'previous_url':previous_url,
+                                    'count_strategy': count_strategy
                                    },
                     'data' : objects, # result_data = queryset[start_value:end_value]
                     'count': total_count,
                     'pagination': True
                     }
+        elif stream:
+            result = { 'count': None, 'data': queryset, 'pagination': False, 'stream': True }
         else:
             result = { 'count': len(queryset), 'data': queryset, 'pagination': False }
             # data = [model_to_dict(model_row) for model_row in queryset]
 
         return result
 
+    '''
+        Description: This method return total number of rows of (filtered) queryset, based on "count_strategy" of Manager.
+            1. exact: COUNT(*) on every call.
+            2. cached: exact count, cached for "count_cache_timeout" seconds, cache key is build on normalized filters.
+            3. estimated: number of rows estimated by database's query planner (PostgreSQL and MySQL), 
+                exact count is used for small results (below "count_estimate_min") or unsupported databases.
+        Parameters:
+            1. queryset : QuerySet or PaginatedRawQuerySet
+            2. query_params (Dic): request parameters (filters)
+        Returns:    tuple of (count, name of count strategy used)
+        Exception:  None
+    '''
+    def get_total_count(self, queryset, query_params=None):
+        if self.count_strategy == COUNT_STRATEGY_CACHED:
+            cache_key = self.get_count_cache_key(queryset, query_params)
+            total_count = cache.get(cache_key, None)
+            if total_count is None:
+                total_count = self.get_exact_count(queryset)
+                cache.set(cache_key, total_count, self.count_cache_timeout)
+            return total_count, COUNT_STRATEGY_CACHED
+
+        if self.count_strategy == COUNT_STRATEGY_ESTIMATED:
+            total_count = self.get_estimated_count(queryset)
+            if total_count is not None and total_count >= self.count_estimate_min:
+                return total_count, COUNT_STRATEGY_ESTIMATED
+
+        return self.get_exact_count(queryset), COUNT_STRATEGY_EXACT
+
+    def get_exact_count(self, queryset):
+        if isinstance(queryset, (QuerySet, PaginatedRawQuerySet)):
+            return queryset.count()
+        return len(queryset)
+
+    def get_count_cache_key(self, queryset, query_params=None):
+        filters = {}
+        for key, value in (query_params or {}).items():
+            if key in self.reserved_filter_params and key != 'logged_in_user':
+                continue
+            filters[key] = value.pk if key == 'logged_in_user' and hasattr(value, 'pk') else value
+        filters_hash = hashlib.md5(json.dumps(filters, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        return 'list_count:%s:%s:%s' % (self.__class__.__name__, queryset.model._meta.label_lower, filters_hash)
+
+    def get_estimated_count(self, queryset):
+        try:
+            if isinstance(queryset, QuerySet):
+                sql, sql_params = queryset.query.sql_with_params()
+            elif isinstance(queryset, PaginatedRawQuerySet):
+                sql, sql_params = queryset.original_raw_query, queryset.params
+            else:
+                return None
+
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, sql_params)
+                    plan = cursor.fetchone()[0]
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    return int(plan[0]['Plan']['Plan Rows'])
+                elif connection.vendor == 'mysql':
+                    cursor.execute('EXPLAIN ' + sql, sql_params)
+                    columns = [col[0] for col in cursor.description]
+                    plan_rows = cursor.fetchall()
+                    if len(plan_rows) != 1:
+                        return None  # joins, subqueries: rows of first table are not the number of results, exact count is used
+                    row = dict(zip(columns, plan_rows[0]))
+                    return int(int(row.get('rows') or 0) * float(row.get('filtered') or 100) / 100)
+        except Exception as e:
+            logging.info("Path apis/components/base/base_manager.py  Class: BaseModelManager Method: get_estimated_count(...)  Error: %s" % (str(e)))
+        return None
+
+    '''
+        Description: This method return ordering (list of field names, "-" prefix for descending) used by keyset 
+            pagination. Primary-key is appended as tie-breaker, so every row has a unique position.
+        Parameters:
+            1. queryset : sorted queryset (after queryset_sorting)
+        Returns:    List<String> or None (if ordering can not be used for keyset pagination e.g. expressions, random)
+        Exception:  None
+    '''
+    def get_keyset_ordering(self, queryset):
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        for order_field in ordering:
+            if not isinstance(order_field, str) or order_field == '?':
+                return None
+        pk_field_name = queryset.model._meta.pk.name
+        field_names = [order_field.lstrip('-') for order_field in ordering]
+        if pk_field_name not in field_names and 'pk' not in field_names:
+            ordering.append(pk_field_name)
+        return ordering
+
+    '''
+        Description: This method return True if value of ordering field can be NULL, i.e. field (or any relation on 
+            its path) is nullable. Unknown fields (e.g. annotations) are considered nullable.
+        Parameters:
+            1. model : Model of queryset
+            2. field_name (String): ordering field without "-" prefix e.g. "created_by__name"
+        Returns:    Boolean
+        Exception:  None
+    '''
+    def is_keyset_field_nullable(self, model, field_name):
+        for attr_name in field_name.split('__'):
+            if attr_name == 'pk':
+                field = model._meta.pk
+            else:
+                try:
+                    field = model._meta.get_field(attr_name)
+                except Exception:
+                    return True
+            if getattr(field, 'null', False) or not getattr(field, 'concrete', False):  # nullable or reverse / many-to-many relation
+                return True
+            if field.is_relation:
+                model = field.related_model
+        return False
+
+    '''
+        Description: This method return order_by() expressions of keyset ordering. NULL is sorted as the largest value 
+            (NULLS LAST ascending, NULLS FIRST descending, default of PostgreSQL), so the seek condition is the same 
+            on all databases.
+        Parameters:
+            1. ordering (List): ordering return by get_keyset_ordering()
+            2. reverse (Boolean): True for seek backward (previous page)
+        Returns:    List of OrderBy
+        Exception:  None
+    '''
+    def get_keyset_order_by(self, ordering, reverse=False):
+        order_by = []
+        for order_field in ordering:
+            field_name = order_field.lstrip('-')
+            if order_field.startswith('-') != reverse:
+                order_by.append(F(field_name).desc(nulls_first=True))
+            else:
+                order_by.append(F(field_name).asc(nulls_last=True))
+        return order_by
+
+    def get_keyset_row_value(self, row, field_name):
+        if isinstance(row, dict):
+            return row.get(field_name)
+        value = row
+        for attr_name in field_name.split('__'):
+            value = getattr(value, attr_name, None)
+            if value is None:
+                break
+        if hasattr(value, '_meta') and hasattr(value, 'pk'):
+            value = value.pk
+        return value
+
+    def encode_page_cursor(self, ordering, row):
+        cursor = {'o': ordering, 'v': [self.get_keyset_row_value(row, order_field.lstrip('-')) for order_field in ordering]}
+        return Base64EncodeDecode.urlsafe_base64_encode(json.dumps(cursor, cls=KeysetCursorEncoder).encode('utf-8')).decode('ascii')
+
+    def decode_page_cursor(self, cursor, ordering):
+        try:
+            cursor = json.loads(Base64EncodeDecode.urlsafe_base64_decode(cursor).decode('utf-8'))
+        except ValueError:
+            raise ValueError("Invalid page cursor.")
+        if not isinstance(cursor, dict) or cursor.get('o') != ordering or len(cursor.get('v') or []) != len(ordering):
+            raise ValueError("Invalid page cursor, sorting has been changed.")
+        return cursor['v']
+
+    '''
+        Description: This method build "seek" condition, i.e. rows positioned after (or before) the given cursor values.
+            e.g. ordering ['-created_on', 'id']  ==>  created_on < v1 OR (created_on = v1 AND id > v2)
+            NULL is the largest value (see get_keyset_order_by), so for nullable fields: 
+                after v (ascending)  ==>  field > v OR field IS NULL,   after NULL (ascending)  ==>  no row
+                after v (descending) ==>  field < v,                    after NULL (descending) ==>  field IS NOT NULL
+        Parameters:
+            1. ordering (List): ordering return by get_keyset_ordering()
+            2. values (List): values of ordering fields from cursor
+            3. reverse (Boolean): True for seek backward (previous page)
+            4. nullable_fields (Set): names of ordering fields which can be NULL
+        Returns:    object of Q
+        Exception:  None
+    '''
+    def keyset_seek_filter(self, ordering, values, reverse=False, nullable_fields=None):
+        nullable_fields = nullable_fields or set()
+        condition = Q(pk__in=[])
+        for idx, order_field in enumerate(ordering):
+            field_name = order_field.lstrip('-')
+            descending = order_field.startswith('-') != reverse
+            value = values[idx]
+            if value is None:
+                if descending:
+                    q = Q(**{'%s__isnull' % (field_name): False})
+                else:
+                    continue  # nothing is sorted after NULL
+            else:
+                q = Q(**{'%s__%s' % (field_name, 'lt' if descending else 'gt'): value})
+                if not descending and field_name in nullable_fields:
+                    q |= Q(**{'%s__isnull' % (field_name): True})
+            for prev_order_field, prev_value in zip(ordering[:idx], values[:idx]):
+                if prev_value is None:
+                    q &= Q(**{'%s__isnull' % (prev_order_field.lstrip('-')): True})
+                else:
+                    q &= Q(**{prev_order_field.lstrip('-'): prev_value})
+            condition |= q
+        return condition
+
+    '''
+        Description: Keyset (seek) pagination, used when "page_after" or "page_before" is provided in request.
+            Unlike LIMIT/OFFSET pagination, the cost of each page is the same, no matter how deep the page is, 
+            and the total count is calculated only if "with_count" is provided.
+            An empty "page_after" returns first page.
+        Parameters:
+            1. queryset : sorted queryset (after queryset_sorting)
+            2. query_params (Dic): page_after / page_before (opaque cursor), page_size, with_count
+        Returns:    Dic, same as list_by_queryset(), "count" is number of rows in the page unless "with_count" provided
+        Exception:  ValueError (if cursor is invalid)
+    '''
+    def list_by_keyset(self, queryset, query_params):
+        ordering = self.get_keyset_ordering(queryset)
+        if ordering is None:
+            raise ValueError("Keyset pagination is not supported for this sorting.")
+
+        items_per_page = int(query_params.get('page_size', 10))
+        page_before = query_params.get('page_before', None)
+        page_after = query_params.get('page_after', None)
+        is_backward = bool(page_before)
+        cursor = page_before if is_backward else page_after
+
+        filtered_queryset = queryset
+        queryset = queryset.order_by(*self.get_keyset_order_by(ordering, reverse=is_backward))
+        if cursor:
+            values = self.decode_page_cursor(cursor, ordering)
+            nullable_fields = set(order_field.lstrip('-') for order_field in ordering
+                                  if self.is_keyset_field_nullable(queryset.model, order_field.lstrip('-')))
+            queryset = queryset.filter(self.keyset_seek_filter(ordering, values, reverse=is_backward, nullable_fields=nullable_fields))
+
+        objects = list(queryset[:items_per_page + 1])
+        has_more = len(objects) > items_per_page
+        objects = objects[:items_per_page]
+        if is_backward:
+            objects.reverse()
+            next_url, previous_url = True, has_more
+        else:
+            next_url, previous_url = has_more, bool(cursor)
+
+        page_info = {'items_per_page': items_per_page,
+                     'next_url': next_url and bool(objects),
+                     'previous_url': previous_url and bool(objects),
+                     'next_cursor': self.encode_page_cursor(ordering, objects[-1]) if next_url and objects else None,
+                     'previous_cursor': self.encode_page_cursor(ordering, objects[0]) if previous_url and objects else None,
+                     'pagination_mode': 'keyset'}
+
+        if self.to_boolean_value(query_params.get('with_count', False)):
+            total_count, page_info['count_strategy'] = self.get_total_count(filtered_queryset, query_params)
+            page_info['num_pages'] = (total_count + items_per_page - 1) // items_per_page
+        else:
+            total_count = len(objects)
+
+        return {'page_info': page_info,
+                'data': objects,
+                'count': total_count,
+                'pagination': True}
+
     def get_raw_query_params(self, params=None, **kwargs):
         dict_params = { 'raw_query': None,
                         'raw_count_query': None,
@@ -747,6 +1343,26 @@ class BaseModelManager(BaseManager):
 
         return tmp_raw_query_params
 
+    '''
+        Description: Keep only required columns of raw query, i.e. "only_fields" (with "_id" column of foreign keys) 
+            and primary key. Not loaded columns are deferred by RawQuerySet.
+        Parameters:
+            1. fields (List): all columns of raw query
+            2. only_fields (List): names of model fields
+            3. LocalModel : Model of raw query
+        Returns: List of columns
+        Exception: None
+    '''
+    def trim_row_query_fields(self, fields, only_fields, LocalModel=None):
+        load_fields = set(only_fields)
+        load_fields.update(['id', 'pk'])
+        if LocalModel:
+            load_fields.add(LocalModel._meta.pk.name)
+            load_fields.add(LocalModel._meta.pk.column)
+        row_query_fields = [field for field in fields
+                            if field in load_fields or (field.endswith('_id') and field[:-3] in load_fields)]
+        return row_query_fields if row_query_fields else fields
+
     def set_order_by_in_row_query(self, raw_query_params, base_raw_query, sql_cols, params=None, **kwargs):
         raw_query_params['raw_query'] = 'SELECT %s FROM (%s) AS t ORDER BY id DESC ' % ( sql_cols, raw_query_params['raw_query'])
         raw_query_params['raw_count_query'] = self.build_count_raw_sql(raw_query_params, base_raw_query=base_raw_query, params=params, **kwargs)
@@ -769,6 +1385,8 @@ class BaseModelManager(BaseManager):
                 raw_query_params = self.get_row_query_model_info(raw_query_params, params=None, **kwargs)
 
             LocalModel = raw_query_params.pop('Model', None)
+            if kwargs.get('only_fields', None):
+                raw_query_params['fields'] = self.trim_row_query_fields(raw_query_params['fields'], kwargs['only_fields'], LocalModel)
             sql_cols = ','.join(raw_query_params['fields'])
 
 
@@ -798,12 +1416,45 @@ class BaseModelManager(BaseManager):
         #     queryset = self.get_queryset(query_params=query_params, method='list', **kwargs)
 
         kwargs['service_method'] = kwargs.get('service_method', params.get('service_method', 'list') if params else 'list')
+        projection_fields = kwargs.pop('projection_fields', None)
 
         queryset = self.get_queryset_by_row_query(params=params, **kwargs)
         if queryset==None:
             queryset = self.get_queryset(query_params=query_params, method='list', **kwargs)
 
-        return self.list_by_queryset(queryset, query_params)
+        is_projection = bool(projection_fields) and self.can_project_queryset(queryset, query_params, projection_fields)
+        if is_projection:
+            queryset = queryset.values(*projection_fields)
+
+        stream = kwargs.get('stream', False) or self.to_boolean_value(query_params.get('stream', False))
+        result = self.list_by_queryset(queryset, query_params, stream=stream)
+        if is_projection:
+            result['projection'] = True
+        return result
+
+    '''
+        Description: Check queryset can be fetched as plain dicts i.e. queryset.values(*projection_fields).
+            Raw querysets can not, and keyset pagination needs all ordering fields in each row (for cursor).
+        Parameters:  
+            1. queryset : filtered and sorted queryset
+            2. query_params (Dic): pagination parameters
+            3. projection_fields (List): names of model fields
+        Returns:    Boolean
+        Exception:  None
+    '''
+    def can_project_queryset(self, queryset, query_params, projection_fields):
+        if not isinstance(queryset, QuerySet) or queryset._fields is not None:
+            return False
+        if 'page_after' in query_params or 'page_before' in query_params:
+            ordering = self.get_keyset_ordering(queryset)
+            if ordering is None:
+                return False
+            pk_field_name = queryset.model._meta.pk.name
+            for order_field in ordering:
+                field_name = order_field.lstrip('-')
+                if (pk_field_name if field_name == 'pk' else field_name) not in projection_fields:
+                    return False
+        return True
 
 
     def list_old(self, params=None, **kwargs):
@@ -983,6 +1634,7 @@ class BaseModelManager(BaseManager):
 
 
 class OneToManyRelationshipModelManager(BaseModelManager):
+    reserved_filter_params = BaseModelManager.reserved_filter_params | frozenset(['list_method_name', 'fetch_clients'])
 
     def __init__(self, app_name, linked_table_model_name, linked_right_model_name,
                        linked_model_left_field_name, linked_model_right_field_name ):
@@ -1028,55 +1680,63 @@ class OneToManyRelationshipModelManager(BaseModelManager):
         return res_tuple[0]
 
 
-    def save_link_table(self, objLinkedLeftModel, objLinkedRightModelList=[], params=None, **kwargs):
-        default_param_dic = params.get('default_param_dic', None)
-        existing_right_model_ids = []
-        to_be_deleted_ids = []
-        kwargs={}
-        kwargs[self.linked_model_left_field_name + '_id'] = objLinkedLeftModel.id
-        linked_objects = self.linkedTableModel.objects.filter(**kwargs).values()
-        del_rows = 0
-        no_change_rows = 0
-        new_rows = 0
-        for obj in linked_objects:
-            found = False
-            for item in objLinkedRightModelList:
-                item_id = item if isinstance(item, int) else ( int(item) if isinstance(item, str) else item.id )
-                if obj[self.linked_model_right_field_name + '_id'] == item_id:
-                    found = True
-                    break
-            if found == False:
-                to_be_deleted_ids.append(obj['id'])
-            else:
-                existing_right_model_ids.append(obj[self.linked_model_right_field_name + '_id'])
-                no_change_rows = no_change_rows + 1
-        if to_be_deleted_ids:
-            del_rows = self.linkedTableModel.objects.filter(id__in= to_be_deleted_ids).delete()
-            del_rows = len(to_be_deleted_ids)
-        for item in objLinkedRightModelList:
-            item_id = item if isinstance(item, int) else ( int(item) if isinstance(item, str) else item.id )
-            found = False
-            for existing_id in existing_right_model_ids:
-                if item_id == existing_id:
-                    found = True
-                    break
-            if found == False:
+    def get_link_item_id(self, item):
+        return item if isinstance(item, int) else ( int(item) if isinstance(item, str) else item.id )
+
+    '''
+        Description: This method sync link-table rows of given left object with given list of right objects,
+            i.e. insert missing links (single bulk_create), delete links which are not in the list (single DELETE), 
+            in one transaction.
+        Parameters:
+            1. objLinkedLeftModel : object of left Model
+            2. objLinkedRightModelList (List): objects (or ids) of right Model
+            3. params (Dic): 'default_param_dic' is used as default values of new link rows
+            4. reload_links (Boolean): if False, linked rows are not fetched again after save (returns None)
+        Returns:    tuple of (new_rows, del_rows, no_change_rows, linked_objects)
+        Exception:  None
+    '''
+    def save_link_table(self, objLinkedLeftModel, objLinkedRightModelList=[], params=None, reload_links=True, **kwargs):
+        default_param_dic = params.get('default_param_dic', None) if params else None
+        left_field_name = self.linked_model_left_field_name + '_id'
+        right_field_name = self.linked_model_right_field_name + '_id'
+        kwargs = {left_field_name: objLinkedLeftModel.id}
+
+        right_model_ids = set(self.get_link_item_id(item) for item in objLinkedRightModelList)
+        # delete and insert in one transaction, a failure between them does not leave links half updated
+        with transaction.atomic():
+            existing_right_model_ids = set()
+            to_be_deleted_ids = []
+            no_change_rows = 0
+            for link_id, right_model_id in self.linkedTableModel.objects.filter(**kwargs).values_list('id', right_field_name):
+                if right_model_id in right_model_ids:
+                    existing_right_model_ids.add(right_model_id)
+                    no_change_rows = no_change_rows + 1
+                else:
+                    to_be_deleted_ids.append(link_id)
+
+            del_rows = 0
+            if to_be_deleted_ids:
+                self.linkedTableModel.objects.filter(id__in= to_be_deleted_ids).delete()
+                del_rows = len(to_be_deleted_ids)
+
+            new_links = []
+            for item_id in right_model_ids - existing_right_model_ids:
                 updated_kwargs = {}
                 if default_param_dic:
                     updated_kwargs.update(default_param_dic)
-                updated_kwargs[self.linked_model_left_field_name + '_id'] = objLinkedLeftModel.id
-                updated_kwargs[self.linked_model_right_field_name + '_id'] = item_id
-                obj = self.linkedTableModel.objects.create(**updated_kwargs)
-                new_rows = new_rows + 1
-
-        kwargs = {}
-        kwargs[self.linked_model_left_field_name + '_id'] = objLinkedLeftModel.id
-        linked_objects = self.linkedTableModel.objects.filter(**kwargs).values()
+                updated_kwargs[left_field_name] = objLinkedLeftModel.id
+                updated_kwargs[right_field_name] = item_id
+                new_links.append(self.linkedTableModel(**updated_kwargs))
+            if new_links:
+                self.linkedTableModel.objects.bulk_create(new_links)
+            new_rows = len(new_links)
+
+        linked_objects = self.linkedTableModel.objects.filter(**kwargs).values() if reload_links else None
         return new_rows, del_rows, no_change_rows, linked_objects
 
     def event_before_filter(self, name, value, queryset, request_params=None):
         # print("name: ", name)
-        if name in ['order_by', 'service_method', 'fields', 'page', 'page_size', 'logged_in_user', 'list_method_name', 'list_method_name', 'fetch_clients']:
+        if name in self.reserved_filter_params:
             return None
         if request_params.get('list_method_name', None) == 'right_model_list' and not ( name.startswith("both_model") or name.startswith("right_model") ):
             return None
@@ -1140,6 +1800,7 @@ class OneToManyRelationshipModelManager(BaseModelManager):
         Filter to fetch list of client (of given Linked Object's id)
         i.e.  linked_objects_field_name = company_detail_id
     '''
+    @request_filter
     def filter_left_model_pk(self, value, queryset, request_params=None):
         if value:
             kwargs = {}
@@ -1164,6 +1825,7 @@ class OneToManyRelationshipModelManager(BaseModelManager):
          WHERE L.company_detail_id IN (SELECT U0.company_detail_id FROM company_detail_user_link U0 WHERE U0.user_detail_id IN (80, 62, 79))
      
     '''
+    @request_filter
     def filter_right_model_pk(self, value, queryset, request_params=None):
         if value:
             kwargs_user_detail = {}
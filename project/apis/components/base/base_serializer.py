@@ -1,7 +1,17 @@
+import copy
 import json
+import threading
+from datetime import datetime
 
 from rest_framework import serializers
 from django.apps import apps
+from django.utils import timezone
+
+# Parsed "fields" param per (serializer class, field spec), so same spec is not parsed again for every instance.
+FIELD_SPEC_CACHE_SIZE = 512
+_field_spec_cache = {}
+_field_spec_cache_lock = threading.Lock()
+
 
 class BaseSerializer(serializers.Serializer):
 
@@ -9,15 +19,85 @@ class BaseSerializer(serializers.Serializer):
         # Instantiate the superclass normally
         super(BaseSerializer, self).__init__(*args, **kwargs)
         self.inner_fields={}
+        self.allowed_fields = None
+        self.field_spec = self.context.get('fields', None) # self.context['request'].query_params.get('fields')
+        self.apply_field_spec(self.field_spec)
 
-        fields = self.get_param_fields() #self.context.get('fields', None) # self.context['request'].query_params.get('fields')
-        if fields:
-            if type(fields) == list and len(fields) >0:
-                # Drop any fields that are not specified in the `fields` argument.
-                allowed = set(fields)
-                existing = set(self.fields.keys())
-                for field_name in existing - allowed:
-                        self.fields.pop(field_name)
+    '''
+        Description: Set "fields" param of this serializer, used for nested serializer (inner fields of parent), 
+            because nested serializer share context of root serializer.
+        Parameters:  
+            1. field_spec : same as "fields" param i.e. list, comma separated string or JSON string
+        Returns:    None
+        Exception:  ValidationError
+    '''
+    def set_field_spec(self, field_spec):
+        self.field_spec = field_spec
+        self.apply_field_spec(field_spec)
+        self.__dict__.pop('fields', None)  # drop already built fields (cached property), if any
+
+    def apply_field_spec(self, field_spec):
+        fields, inner_fields = self.get_cached_param_fields(field_spec)
+        self.inner_fields = dict(inner_fields)
+        # Drop any fields that are not specified in the `fields` argument.
+        self.allowed_fields = set(fields) if type(fields) == list and len(fields) > 0 else None
+
+    '''
+        Description: Cached version of get_param_fields(), key is (serializer class, normalized field spec).
+        Parameters:  
+            1. field_spec : "fields" param
+        Returns:    tuple of (fields, inner_fields)
+        Exception:  ValidationError
+    '''
+    def get_cached_param_fields(self, field_spec):
+        if not field_spec:
+            return [], {}
+        try:
+            spec_key = field_spec if isinstance(field_spec, str) else json.dumps(field_spec, sort_keys=True)
+        except (TypeError, ValueError):
+            spec_key = None
+        cache_key = (type(self), spec_key)
+        if spec_key is not None:
+            cached = _field_spec_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        self.inner_fields = {}
+        fields = self.get_param_fields(field_spec)
+        cached = (fields, dict(self.inner_fields))
+        if spec_key is not None:
+            with _field_spec_cache_lock:
+                if len(_field_spec_cache) >= FIELD_SPEC_CACHE_SIZE:
+                    _field_spec_cache.clear()
+                _field_spec_cache[cache_key] = cached
+        return cached
+
+    '''
+        Description: Build only required fields, instead of deep-copying all declared fields and then dropping them. 
+            Also pass "inner_fields" to nested serializers, so they build only required fields as well.
+        Parameters:  None
+        Returns:    dic of fields
+        Exception:  None
+    '''
+    def get_fields(self):
+        allowed = self.allowed_fields
+        if allowed is not None and not isinstance(self, serializers.ModelSerializer):
+            fields = copy.deepcopy(dict((name, field) for name, field in self._declared_fields.items() if name in allowed))
+        else:
+            fields = super(BaseSerializer, self).get_fields()
+            if allowed is not None:
+                for field_name in set(fields.keys()) - allowed:
+                    fields.pop(field_name)
+        self.apply_inner_fields(fields)
+        return fields
+
+    def apply_inner_fields(self, fields):
+        for field_name, field_spec in self.inner_fields.items():
+            field = fields.get(field_name)
+            if isinstance(field, serializers.ListSerializer):
+                field = field.child
+            if isinstance(field, BaseSerializer):
+                field.set_field_spec(field_spec)
 
 
     def get_param_fields(self, fields = []):
@@ -75,6 +155,8 @@ class BaseSerializer(serializers.Serializer):
 
     def date_str_format(self, dt, on_error= ""):
         try:
+            if isinstance(dt, datetime) and timezone.is_aware(dt):
+                dt = timezone.localtime(dt)  # current (client's) timezone, see TimezoneMiddleware
             return dt.strftime("%b %d, %Y")
         except:
             return on_error
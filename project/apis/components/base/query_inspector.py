@@ -0,0 +1,224 @@
+import logging
+import re
+import sys
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+'''
+    Query inspector is a development / staging instrumentation, it is configured by settings.QUERY_INSPECTOR e.g.
+        QUERY_INSPECTOR = {
+            'ENABLED': True,                # inspect every request of BaseController
+            'N_PLUS_ONE_THRESHOLD': 5,      # same SQL shape executed N times in a request is reported as N+1
+            'BUDGET': 50,                   # max number of queries per request (None: no budget)
+            'RAISE_ON_BUDGET': False,       # True: request fails (HTTP 500) with QueryBudgetExceeded, False: only log
+        }
+    It can be used in tests (e.g. against SQLite) as a context manager:
+        with QueryInspector(budget=5) as inspector:
+            response = client.get('/api/...')
+        self.assertFalse(inspector.n_plus_one())
+    QueryBudgetExceeded is raised when the inspector exits (not by the query which exceeded the budget), and only 
+    if no other exception is raised, so it never hides a database error.
+'''
+QUERY_INSPECTOR_DEFAULTS = {
+    'ENABLED': False,
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'BUDGET': None,
+    'RAISE_ON_BUDGET': False,
+}
+
+
+def get_slow_query_ms():
+    return getattr(settings, 'SQL_LOG_SLOW_MS', None)
+
+
+def get_query_inspector_settings():
+    inspector_settings = dict(QUERY_INSPECTOR_DEFAULTS)
+    inspector_settings.update(getattr(settings, 'QUERY_INSPECTOR', {}) or {})
+    return inspector_settings
+
+
+class QueryBudgetExceeded(Exception):
+    def __init__(self, query_count, budget, inspector=None):
+        self.query_count = query_count
+        self.budget = budget
+        self.inspector = inspector
+        super(QueryBudgetExceeded, self).__init__("Query budget exceeded: %s queries executed, budget is %s" % (query_count, budget))
+
+
+_re_sql_string = re.compile(r"'(?:[^']|'')*'")
+_re_sql_number = re.compile(r"\b\d+(?:\.\d+)?\b")
+_re_sql_in_list = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)")
+_re_sql_space = re.compile(r"\s+")
+
+'''
+    Description: Normalize SQL, so same query with different values has same shape
+        e.g. "SELECT ... WHERE id = 1" and "SELECT ... WHERE id = 2" ==> "SELECT ... WHERE id = ?"
+    Parameters:
+        1. sql (String): SQL query
+    Returns:    String
+    Exception:  None
+'''
+def normalize_sql(sql):
+    sql = _re_sql_string.sub('?', sql)
+    sql = _re_sql_number.sub('?', sql)
+    sql = _re_sql_in_list.sub('(...)', sql)
+    return _re_sql_space.sub(' ', sql).strip()
+
+
+'''
+    Description: Find Manager's method, which executed query, i.e. nearest frame of call stack whose "self" is
+        a Manager (BaseModelManager or BaseAPIManager).
+    Parameters:  None
+    Returns:    String e.g. "ClientManager.list" or None
+    Exception:  None
+'''
+def find_manager_method(skip_frames=2):
+    from apis.components.base.base_manager import BaseModelManager
+    from apis.components.base.base_api_manager import BaseAPIManager
+
+    frame = sys._getframe(skip_frames)
+    while frame is not None:
+        obj = frame.f_locals.get('self', None)
+        if obj is not None and isinstance(obj, (BaseModelManager, BaseAPIManager)):
+            return "%s.%s" % (obj.__class__.__name__, frame.f_code.co_name)
+        frame = frame.f_back
+    return None
+
+
+class QueryShape(object):
+    def __init__(self, sql):
+        self.sql = sql
+        self.count = 0
+        self.duration = 0.0
+        self.origins = []
+
+    def to_dict(self):
+        return {'sql': self.sql, 'count': self.count, 'duration_ms': round(self.duration * 1000, 3), 'origins': self.origins}
+
+
+class QueryInspector(object):
+    '''
+        Description: Count queries (on all databases) while it is active, group them by normalized SQL shape,
+            find repeated shapes (N+1) with originating Manager's method and check query budget.
+            It is a database execute wrapper (connection.execute_wrapper) and a context manager.
+    '''
+    def __init__(self, budget=None, n_plus_one_threshold=None, raise_on_budget=None, using=None):
+        inspector_settings = get_query_inspector_settings()
+        self.budget = budget if budget is not None else inspector_settings['BUDGET']
+        self.n_plus_one_threshold = n_plus_one_threshold if n_plus_one_threshold is not None else inspector_settings['N_PLUS_ONE_THRESHOLD']
+        self.raise_on_budget = raise_on_budget if raise_on_budget is not None else inspector_settings['RAISE_ON_BUDGET']
+        self.using = using
+        self.query_count = 0
+        self.duration = 0.0
+        self.shapes = {}
+        self.budget_exceeded = False
+        self._exit_stack = None
+
+    def __enter__(self):
+        self._exit_stack = ExitStack()
+        aliases = [self.using] if self.using else list(connections)
+        for alias in aliases:
+            self._exit_stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._exit_stack.close()
+        self._exit_stack = None
+        if exc_type is None and self.budget_exceeded and self.raise_on_budget:
+            raise QueryBudgetExceeded(self.query_count, self.budget, self)
+        return False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.time()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, time.time() - start)
+
+    def record(self, sql, duration):
+        self.query_count = self.query_count + 1
+        self.duration = self.duration + duration
+        sql_shape = normalize_sql(sql)
+        shape = self.shapes.get(sql_shape)
+        if shape is None:
+            shape = self.shapes[sql_shape] = QueryShape(sql_shape)
+        shape.count = shape.count + 1
+        shape.duration = shape.duration + duration
+        origin = find_manager_method(skip_frames=3)
+        if origin and origin not in shape.origins:
+            shape.origins.append(origin)
+
+        if self.budget is not None and self.query_count > self.budget:
+            self.budget_exceeded = True
+
+    def n_plus_one(self):
+        return [shape.to_dict() for shape in sorted(self.shapes.values(), key=lambda s: -s.count)
+                if shape.count >= self.n_plus_one_threshold]
+
+    def report(self):
+        return {'query_count': self.query_count,
+                'duration_ms': round(self.duration * 1000, 3),
+                'budget': self.budget,
+                'budget_exceeded': self.budget_exceeded,
+                'n_plus_one': self.n_plus_one()}
+
+    def log_report(self, title=""):
+        logging.info("Path apis/components/base/query_inspector.py  Class: QueryInspector Method: log_report(...)  %s  Queries: %s  Time: %.3f ms" % (
+            title, self.query_count, self.duration * 1000))
+        for shape in self.n_plus_one():
+            logging.warning("Path apis/components/base/query_inspector.py  Class: QueryInspector Method: log_report(...)  %s  N+1: %s x [%s]  Origin: %s" % (
+                title, shape['count'], shape['sql'], ', '.join(shape['origins']) or 'unknown'))
+        if self.budget_exceeded:
+            logging.warning("Path apis/components/base/query_inspector.py  Class: QueryInspector Method: log_report(...)  %s  Query budget exceeded: %s > %s" % (
+                title, self.query_count, self.budget))
+
+
+class SlowQueryLogger(object):
+    '''
+        Description: Log only queries whose execution time exceed "threshold_ms" (default settings.SQL_LOG_SLOW_MS, 
+            read on each query), with their time and originating Manager's method. It is a database execute wrapper 
+            and a context manager. It is installed on every connection by install_slow_query_logger().
+    '''
+    def __init__(self, threshold_ms=None, using=None):
+        self.threshold_ms = threshold_ms
+        self.using = using
+        self._exit_stack = None
+
+    def __enter__(self):
+        self._exit_stack = ExitStack()
+        aliases = [self.using] if self.using else list(connections)
+        for alias in aliases:
+            self._exit_stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._exit_stack.close()
+        self._exit_stack = None
+        return False
+
+    def __call__(self, execute, sql, params, many, context):
+        threshold_ms = self.threshold_ms if self.threshold_ms is not None else get_slow_query_ms()
+        if not threshold_ms:
+            return execute(sql, params, many, context)
+        start = time.time()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.time() - start) * 1000
+            if duration_ms >= threshold_ms:
+                logging.warning("Path apis/components/base/query_inspector.py  Class: SlowQueryLogger  Slow query: %.1f ms  Origin: %s  SQL: %s  Params: %s",
+                                duration_ms, find_manager_method(skip_frames=2) or 'unknown', sql, params)
+
+
+'''
+    Install SlowQueryLogger on every database connection (signal connection_created, connected in 
+    ComponentsConfig.ready()), so slow queries are logged for requests, management commands and tasks alike.
+'''
+def install_slow_query_logger(sender=None, connection=None, **kwargs):
+    if connection is None or any(isinstance(wrapper, SlowQueryLogger) for wrapper in connection.execute_wrappers):
+        return  # connection_created is sent again when connection is reopened
+    # outermost wrapper, execute_wrapper() context managers remove the last wrapper on exit
+    connection.execute_wrappers.insert(0, SlowQueryLogger())
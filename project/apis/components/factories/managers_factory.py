@@ -1,6 +1,27 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
 from apis.components.base.base_manager import BaseModelManager
 from apis.components.factories.utility import SingletonBaseClass
 
+'''
+    Declarative registry of Managers: name of Manager ==> class path. Managers are instantiated lazily, on first
+    get_manager() call, and cached. More Managers can be registered by settings.MANAGERS_REGISTRY (same format).
+'''
+MANAGERS_REGISTRY = OrderedDict([
+    ('CommonManager', 'apis.common.managers.CommonManager'),
+    ('SystemSettingsManager', 'apis.common.managers.SystemSettingsManager'),
+])
+
+
+class ManagerNotRegistered(LookupError):
+    pass
+
 
 class ManagersFactory(metaclass=SingletonBaseClass):
     # __metaclass__ = SingletonBaseClass
@@ -9,6 +30,9 @@ class ManagersFactory(metaclass=SingletonBaseClass):
 
     def __init__(self):
         self.managers_dic = {}
+        self.manager_paths = {}
+        self.construction_times = OrderedDict()
+        self.lock = threading.RLock()  # re-entrant, Manager's __init__ get common manager from this Factory
         self.manager_type = "FILE"
 
     @staticmethod
@@ -33,20 +57,67 @@ class ManagersFactory(metaclass=SingletonBaseClass):
         if not managerName_upper in instance.managers_dic:
             instance.managers_dic[managerName_upper] = objManager
 
+    '''
+        Description: Register class path of a Manager, Manager is instantiated on first get_manager() call.
+        Parameters:
+            1. managerName (String): name of Manager
+            2. class_path (String): e.g. "apis.common.managers.CommonManager"
+        Returns: None
+        Exception: None
+    '''
+    @staticmethod
+    def register_class(managerName, class_path):
+        instance = ManagersFactory.get_instance()
+        managerName_upper = managerName.upper()
+        if not managerName_upper in instance.manager_paths:
+            instance.manager_paths[managerName_upper] = class_path
+
     def get_manager(self, managerName):
         managerName_upper = managerName.upper()
-        if not managerName_upper in self.managers_dic:
-            raise NotImplemented()
-        #     raise Exception('Getter for "%s" Not Implemented in ManagersFactory'%(managerName))
-        return self.managers_dic[managerName_upper]
+        manager = self.managers_dic.get(managerName_upper)
+        if manager is not None:
+            return manager
+        with self.lock:
+            if not managerName_upper in self.managers_dic:
+                if not managerName_upper in self.manager_paths:
+                    raise ManagerNotRegistered('Manager "%s" is not registered in ManagersFactory' % (managerName))
+                self.managers_dic[managerName_upper] = self.build_manager(managerName, self.manager_paths[managerName_upper])
+            return self.managers_dic[managerName_upper]
 
     get_manager.__annotations__ = {'return': BaseModelManager}
 
-    # Register all Managers to this Factory
+    def build_manager(self, managerName, class_path):
+        start_time = time.time()
+        manager = import_string(class_path)()
+        construction_time = time.time() - start_time
+        self.construction_times[managerName] = construction_time
+        logging.info("Path apis/components/factories/managers_factory.py  Class: ManagersFactory Method: build_manager(...)  Manager: %s  Time: %.2f ms" % (
+            managerName, construction_time * 1000))
+        return manager
+
+    # Register all Managers to this Factory (Managers are instantiated lazily)
     def register_all_managers(self):
-        from apis.common.managers import CommonManager
-        common_manager = CommonManager()
-        self.register(common_manager, CommonManager.get_manager_name())
+        registry = OrderedDict(MANAGERS_REGISTRY)
+        registry.update(getattr(settings, 'MANAGERS_REGISTRY', {}))
+        for managerName, class_path in registry.items():
+            self.register_class(managerName, class_path)
+
+    '''
+        Description: Instantiate registered Managers (all, or given names), e.g. before worker start serving requests.
+        Parameters:
+            1. managerNames (List): names of Managers, default all registered Managers
+        Returns: List of (name of Manager, construction time in seconds), slowest first
+        Exception: ManagerNotRegistered
+    '''
+    def warm_up(self, managerNames=None):
+        if managerNames is None:
+            managerNames = list(self.manager_paths.keys())
+        for managerName in managerNames:
+            self.get_manager(managerName)
+        return self.get_construction_report()
+
+    def get_construction_report(self):
+        return sorted(self.construction_times.items(), key=lambda item: -item[1])
 
     def get_common_manager(self):
         from apis.common.managers import CommonManager
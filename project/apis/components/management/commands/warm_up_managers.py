@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apis.components.factories.managers_factory import ManagersFactory, ManagerNotRegistered
+
+
+class Command(BaseCommand):
+    help = 'Instantiate registered Managers (all, or given names) and report construction time of each Manager.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('managers', nargs='*', help='Names of Managers, default all registered Managers')
+
+    def handle(self, *args, **options):
+        factory = ManagersFactory.get_instance()
+        factory.register_all_managers()
+        try:
+            report = factory.warm_up(options['managers'] or None)
+        except ManagerNotRegistered as e:
+            raise CommandError(str(e))
+
+        total_time = 0
+        for manager_name, construction_time in report:
+            total_time = total_time + construction_time
+            self.stdout.write("%-40s %10.2f ms" % (manager_name, construction_time * 1000))
+        self.stdout.write(self.style.SUCCESS("%s Manager(s) constructed in %.2f ms" % (len(report), total_time * 1000)))
@@ -1,3 +1,646 @@
-from django.test import TestCase
+import datetime
+import json
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.paginator import EmptyPage
+from django.db import DatabaseError, connection, models
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from apis.components.base.base_controller import BaseController
+from apis.components.base.query_inspector import QueryBudgetExceeded, QueryInspector, SlowQueryLogger
+from apis.components.base.base_api_manager import BaseAPIManager, fan_out_api_calls, get_cache_refresh_executor
+from apis.components.base.base_manager import BaseModelManager, ListPaginator, OneToManyRelationshipModelManager, \
+    request_filter
+
+
+class UserManager(BaseModelManager):
+
+    def __init__(self):
+        super(UserManager, self).__init__('auth', 'User')
+
+    @staticmethod
+    def get_manager_name():
+        return "UserManager"
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        base_time = cls.base_time = timezone.now()
+        for idx in range(25):
+            # every 4th user has never logged in (NULL), others share login time by pairs
+            last_login = None if idx % 4 == 0 else base_time - datetime.timedelta(days=idx // 2)
+            User.objects.create(username='user_%02d' % idx, last_login=last_login)
+
+    def setUp(self):
+        self.manager = UserManager()
+
+    def expected_ids(self, descending):
+        users = list(User.objects.order_by('pk'))
+        # NULL is the largest value, primary-key (ascending) is the tie-breaker (sort is stable)
+        users.sort(key=lambda user: (user.last_login is None, user.last_login or self.base_time), reverse=descending)
+        return [user.pk for user in users]
+
+    def walk_forward(self, order_by, page_size=10):
+        ids, cursor = [], ''
+        while True:
+            result = self.manager.list_by_keyset(User.objects.order_by(order_by), {'page_after': cursor, 'page_size': page_size})
+            ids.extend(user.pk for user in result['data'])
+            cursor = result['page_info']['next_cursor']
+            if not cursor:
+                return ids
+
+    def walk_backward(self, order_by, cursor, page_size=10):
+        ids = []
+        while cursor:
+            result = self.manager.list_by_keyset(User.objects.order_by(order_by), {'page_before': cursor, 'page_size': page_size})
+            ids = [user.pk for user in result['data']] + ids
+            cursor = result['page_info']['previous_cursor']
+        return ids
+
+    def test_ascending_nullable_ordering_returns_all_rows(self):
+        self.assertEqual(self.walk_forward('last_login'), self.expected_ids(descending=False))
+
+    def test_descending_nullable_ordering_returns_all_rows(self):
+        self.assertEqual(self.walk_forward('-last_login'), self.expected_ids(descending=True))
+
+    def test_backward_pages_mirror_forward_pages(self):
+        for order_by, descending in (('last_login', False), ('-last_login', True)):
+            expected = self.expected_ids(descending)
+            last_page = self.manager.list_by_keyset(User.objects.order_by(order_by), {'page_after': '', 'page_size': 25})
+            self.assertEqual([user.pk for user in last_page['data']], expected)
+            cursor = self.manager.encode_page_cursor(self.manager.get_keyset_ordering(User.objects.order_by(order_by)), last_page['data'][-1])
+            self.assertEqual(self.walk_backward(order_by, cursor, page_size=7), expected[:-1])
+
+    def test_cursor_of_other_sorting_is_rejected(self):
+        result = self.manager.list_by_keyset(User.objects.order_by('last_login'), {'page_after': '', 'page_size': 5})
+        with self.assertRaises(ValueError):
+            self.manager.list_by_keyset(User.objects.order_by('-last_login'), {'page_after': result['page_info']['next_cursor']})
+
+
+class ListPaginatorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for idx in range(30):
+            User.objects.create(username='user_%02d' % idx)
+
+    def test_estimated_count_does_not_clamp_pages(self):
+        paginator = ListPaginator(User.objects.order_by('pk'), 10, count=25, is_exact_count=False)
+        pages = [paginator.page(number) for number in (1, 2, 3, 4)]
+        self.assertEqual([len(page.object_list) for page in pages], [10, 10, 10, 0])
+        self.assertEqual([page.has_more_rows for page in pages], [True, True, False, False])
+        self.assertEqual([user.username for user in pages[2].object_list], ['user_%02d' % idx for idx in range(20, 30)])
+
+    def test_exact_count_keeps_django_behaviour(self):
+        paginator = ListPaginator(User.objects.order_by('pk'), 10, count=30)
+        self.assertEqual(len(paginator.page(3).object_list), 10)
+        self.assertFalse(paginator.page(3).has_more_rows)
+        with self.assertRaises(EmptyPage):
+            paginator.page(4)
+
+
+class FakeExplainCursor(object):
+    description = [('id',), ('table',), ('rows',), ('filtered',)]
+
+    def __init__(self, plan_rows):
+        self.plan_rows = plan_rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return self.plan_rows
+
+
+class EstimatedCountTests(TestCase):
+
+    def get_estimated_count(self, plan_rows):
+        fake_connection = mock.Mock(vendor='mysql')
+        fake_connection.cursor.return_value = FakeExplainCursor(plan_rows)
+        with mock.patch('apis.components.base.base_manager.connection', fake_connection):
+            return UserManager().get_estimated_count(User.objects.all())
+
+    def test_mysql_single_table_plan_is_used(self):
+        self.assertEqual(self.get_estimated_count([(1, 'auth_user', 5000, 50.0)]), 2500)
+
+    def test_mysql_plan_with_joins_falls_back_to_exact_count(self):
+        self.assertIsNone(self.get_estimated_count([(1, 'auth_user', 5000, 100.0), (1, 'auth_group', 3, 100.0)]))
+
+
+class BulkSaveTests(TestCase):
+
+    def setUp(self):
+        self.manager = UserManager()
+
+    def test_bulk_save_with_required_ids(self):
+        objs = self.manager.bulk_save({}, [{'username': 'bulk_%02d' % idx} for idx in range(5)], require_ids=True)
+        self.assertTrue(all(obj.pk for obj in objs))
+        self.assertEqual([User.objects.get(pk=obj.pk).username for obj in objs], ['bulk_%02d' % idx for idx in range(5)])
+
+    def test_bulk_save_creates_and_updates(self):
+        existing = User.objects.create(username='existing')
+        objs = self.manager.bulk_save({}, [{'id': existing.pk, 'first_name': 'Updated'}, {'username': 'new'}], batch_size=1)
+        self.assertEqual(len(objs), 2)
+        self.assertEqual(User.objects.get(pk=existing.pk).first_name, 'Updated')
+        self.assertEqual(User.objects.get(pk=existing.pk).username, 'existing')
+        self.assertTrue(User.objects.filter(username='new').exists())
+
+    def test_create_override_is_detected(self):
+        class CustomCreateManager(UserManager):
+            def create(self, params=None, *args, **kwargs):
+                return super(CustomCreateManager, self).create(params, *args, **kwargs)
+
+        self.assertFalse(self.manager.is_create_overridden())
+        self.assertTrue(CustomCreateManager().is_create_overridden())
+
+
+class FailingAPIManager(BaseAPIManager):
+
+    def __init__(self):
+        super(FailingAPIManager, self).__init__('failing_api', 'GET')
+
+    def list(self, params=None, **kwargs):
+        raise ValueError("Connection refused")
+
+
+class TimeoutAPIManager(BaseAPIManager):
+
+    def __init__(self):
+        super(TimeoutAPIManager, self).__init__('timeout_api', 'GET')
+
+    def call_api(self, params=None, request_body=None, **kwargs):
+        return self.get_call_timeout(params=params, **kwargs)
+
+
+class FanOutApiCallsTests(SimpleTestCase):
+
+    def test_failed_list_call_has_list_error_info(self):
+        results = fan_out_api_calls({'failing': (FailingAPIManager(), {})}, deadline=5, method_name='list')
+        self.assertEqual(results['failing']['data'], [])
+        self.assertEqual(results['failing']['error_info'],
+                         {'errors': [{'error_code': 'API_REQUEST_FAILED', 'description': 'Connection refused'}], 'error_no': 1})
+
+    def test_request_timeout_is_limited_to_deadline(self):
+        api_manager = TimeoutAPIManager()
+        results = fan_out_api_calls({'first': (api_manager, {}), 'second': (api_manager, {})}, deadline=2)
+        for key in ('first', 'second'):
+            connect_timeout, read_timeout = results[key]
+            self.assertLessEqual(connect_timeout, 2)
+            self.assertLessEqual(read_timeout, 2)
+        self.assertEqual(api_manager.get_call_timeout(), (api_manager.api_connect_timeout, api_manager.api_read_timeout))
+
+
+class CountingAPIManager(BaseAPIManager):
+    cache_timeout = 60
+
+    def __init__(self):
+        super(CountingAPIManager, self).__init__('counting_api', 'POST')
+        self.calls = []
+        self.calls_lock = threading.Lock()
+
+    def get_request_headers(self, params=None, **kwargs):
+        return {'Content-Type': 'application/json'}
+
+    def call_api(self, params=None, request_body=None, **kwargs):
+        with self.calls_lock:
+            self.calls.append(request_body)
+        time.sleep(0.2)
+        return {'errorCodes': None, 'rows': [request_body]}
+
+    def process_data_for_response(self, api_response, errorCodes, params=None, **kwargs):
+        return api_response['rows']
+
+
+class ListCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.manager = CountingAPIManager()
+
+    def get_params(self, user=None, **request_params):
+        return {'request_params': request_params, 'logged_in_user': user}
+
+    def test_concurrent_misses_call_api_once(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.manager.fetch_list_data_cached(self.get_params(city='Berlin'))))
+                   for idx in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.manager.calls), 1)
+        self.assertEqual([result[0] for result in results], [[{'city': 'Berlin'}]] * 5)
+
+    def test_cache_key_depends_on_user(self):
+        first_user = User.objects.create(username='first')
+        second_user = User.objects.create(username='second')
+        self.manager.fetch_list_data_cached(self.get_params(first_user, city='Berlin'))
+        self.manager.fetch_list_data_cached(self.get_params(first_user, city='Berlin'))
+        self.assertEqual(len(self.manager.calls), 1)
+        self.manager.fetch_list_data_cached(self.get_params(second_user, city='Berlin'))
+        self.assertEqual(len(self.manager.calls), 2)
+
+    def test_refresh_on_miss_keeps_refresh_lock_of_other_worker(self):
+        params = self.get_params(city='Berlin')
+        refresh_lock_key = self.manager.get_list_cache_key(params) + ':refresh'
+        cache.add(refresh_lock_key, True, 60)
+        self.manager.fetch_list_data_cached(params)
+        self.assertTrue(cache.get(refresh_lock_key))
+
+    def test_stale_refresh_does_not_use_fan_out_pool(self):
+        params = self.get_params(city='Berlin')
+        self.manager.fetch_list_data_cached(params)
+        cache_key = self.manager.get_list_cache_key(params)
+        cache_entry = cache.get(cache_key)
+        cache_entry['fresh_until'] = 0
+        cache.set(cache_key, cache_entry, 60)
+        with mock.patch('apis.components.base.base_api_manager.get_fan_out_executor', side_effect=AssertionError):
+            self.assertEqual(self.manager.fetch_list_data_cached(params)[0], [{'city': 'Berlin'}])  # stale data
+            get_cache_refresh_executor().submit(lambda: None).result()
+            for idx in range(50):
+                if cache.get(cache_key)['fresh_until'] > 0:
+                    break
+                time.sleep(0.05)
+        self.assertEqual(len(self.manager.calls), 2)
+        self.assertGreater(cache.get(cache_key)['fresh_until'], 0)
+
+
+class RequestBodyContentTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.controller = BaseController()
+
+    def test_json_body_is_parsed(self):
+        request = self.factory.post('/api/', data='{"name": "value"}', content_type='application/json; charset=utf-8')
+        self.assertEqual(self.controller.get_request_body_content(request), {'name': 'value'})
+
+    def test_json_body_without_json_content_type_is_parsed(self):
+        for content_type in ('', 'text/plain'):
+            request = self.factory.post('/api/', data='{"name": "value"}', content_type=content_type)
+            self.assertEqual(self.controller.get_request_body_content(request), {'name': 'value'})
+
+    def test_urlencoded_body_is_not_read(self):
+        request = self.factory.post('/api/', data='name=value', content_type='application/x-www-form-urlencoded')
+        self.assertIsNone(self.controller.get_request_body_content(request))
+        self.assertEqual(request.POST['name'], 'value')
+
+    def test_invalid_json_body_is_ignored(self):
+        request = self.factory.post('/api/', data='{"name": ', content_type='application/json')
+        self.assertIsNone(self.controller.get_request_body_content(request))
+
+    def test_multipart_body_is_not_read(self):
+        request = self.factory.post('/api/', data={'name': 'value'})
+        self.assertIsNone(self.controller.get_request_body_content(request))
+        self.assertFalse(hasattr(request, '_body'))
+        self.assertEqual(request.POST['name'], 'value')
+
+
+class StreamRowsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        group = Group.objects.create(name='staff')
+        for idx in range(20):
+            User.objects.create(username='user_%02d' % idx).groups.add(group)
+
+    def setUp(self):
+        self.controller = BaseController()
+
+    def test_prefetch_related_is_applied_per_chunk(self):
+        self.controller.stream_chunk_size = 8
+        queryset = User.objects.order_by('pk').prefetch_related('groups')
+        with self.assertNumQueries(1 + 3):  # rows, groups of each of 3 chunks
+            groups = [[group.name for group in user.groups.all()] for user in self.controller.get_stream_rows(queryset)]
+        self.assertEqual(groups, [['staff']] * 20)
+
+    def test_rows_without_prefetch(self):
+        with self.assertNumQueries(1):
+            usernames = [user.username for user in self.controller.get_stream_rows(User.objects.order_by('pk'))]
+        self.assertEqual(len(usernames), 20)
+
+
+class StreamingResponseTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for idx in range(20):
+            User.objects.create(username='user_%02d' % idx)
+
+    def setUp(self):
+        self.controller = BaseController()
+        self.controller.stream_chunk_size = 8
+        self.request = RequestFactory().get('/api/')
+
+    def get_content(self, response):
+        return ''.join(part.decode('utf-8') for part in response.streaming_content)
+
+    def test_rows_are_streamed_as_json(self):
+        response = self.controller.to_streaming_response(self.request, {'data': User.objects.order_by('pk'), 'stream': True},
+                                                         {}, UserSerializer)
+        content = json.loads(self.get_content(response))
+        self.assertEqual(content['data']['count'], 20)
+        self.assertEqual([row['username'] for row in content['data']['result']], ['user_%02d' % idx for idx in range(20)])
+
+    def test_error_in_first_chunk_is_raised_before_response(self):
+        with self.assertRaises(ValueError):
+            self.controller.to_streaming_response(self.request, {'data': User.objects.order_by('pk'), 'stream': True},
+                                                  {}, FailingUserSerializer)
+
+    def test_error_after_first_chunk_is_logged(self):
+        FailingUserSerializer.fail_after = 8
+        try:
+            response = self.controller.to_streaming_response(self.request, {'data': User.objects.order_by('pk'), 'stream': True},
+                                                             {}, FailingUserSerializer)
+            with self.assertLogs(level='ERROR') as logs, self.assertRaises(ValueError):
+                self.get_content(response)
+        finally:
+            FailingUserSerializer.fail_after = 0
+        self.assertIn('streaming failed after 8 row(s)', logs.output[0])
+
+
+class UserSerializer(serializers.Serializer):
+    id = serializers.IntegerField(read_only=True)
+    username = serializers.CharField()
+    email = serializers.CharField()
+
+
+class FailingUserSerializer(UserSerializer):
+    fail_after = 0  # number of rows serialized before error
+
+    def to_representation(self, instance):
+        if User.objects.filter(pk__lt=instance.pk).count() >= self.fail_after:
+            raise ValueError('serializer failed')
+        return super(FailingUserSerializer, self).to_representation(instance)
+
+
+class UserFlagsSerializer(UserSerializer):
+    is_staff = serializers.BooleanField()
+
+
+class ProjectionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for idx in range(3):
+            User.objects.create(username='user_%02d' % idx, email='user_%02d@example.com' % idx)
+
+    def setUp(self):
+        self.controller = BaseController()
+        self.controller.manager = UserManager()
+        self.controller.list_projection = True
+
+    def test_projection_matches_serializer_output(self):
+        projection_fields = self.controller.get_projection_fields(None, {}, cls_serializer=UserSerializer)
+        self.assertEqual(projection_fields, ['id', 'username', 'email'])
+        data_list = self.controller.manager.list({'query_params': {'order_by': 'id'}}, projection_fields=projection_fields)
+        self.assertTrue(data_list['projection'])
+        serialized = UserSerializer(User.objects.order_by('id'), many=True).data
+        self.assertEqual(JSONRenderer().render(list(data_list['data'])), JSONRenderer().render(serialized))
+
+    def test_projection_is_disabled_by_default(self):
+        self.assertFalse(BaseController.list_projection)
+        controller = BaseController()
+        controller.manager = UserManager()
+        self.assertIsNone(controller.get_projection_fields(None, {}, cls_serializer=UserSerializer))
+
+    def test_coercing_fields_are_not_projected(self):
+        self.assertIsNone(self.controller.get_projection_fields(None, {}, cls_serializer=UserFlagsSerializer))
+
+    def test_formatted_date_field_is_not_projected(self):
+        date_field, uuid_field = models.DateField(), models.UUIDField()
+        date_field.set_attributes_from_name('joined_on')
+        uuid_field.set_attributes_from_name('uuid')
+        self.assertTrue(self.controller.is_projection_field(serializers.DateField(), date_field))
+        self.assertFalse(self.controller.is_projection_field(serializers.DateField(format='%d/%m/%Y'), date_field))
+        self.assertTrue(self.controller.is_projection_field(serializers.UUIDField(), uuid_field))
+        self.assertFalse(self.controller.is_projection_field(serializers.UUIDField(format='hex'), uuid_field))
+
+
+class FilteringUserManager(UserManager):
+
+    def filter_username(self, value, queryset, request_params=None):
+        return queryset.filter(username=value)
+
+    @request_filter('staff')
+    def only_staff(self, value, queryset, request_params=None):
+        return queryset.filter(is_staff=self.to_boolean_value(value))
+
+    def filter_email(self, email, users, params=None):  # parameters of other names
+        return users.filter(email=email)
+
+    def filter_usernames(self, usernames):  # helper, not a filter
+        return [username.strip() for username in usernames]
+
+
+class FilterDispatchTableTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create(username='staff_user', is_staff=True)
+        User.objects.create(username='other_user')
+
+    def setUp(self):
+        self.manager = FilteringUserManager()
+
+    def test_dispatch_table_contains_only_filters(self):
+        self.assertEqual(self.manager.get_filter_dispatch_table(), {'xyz': 'filter_xyz', 'username': 'filter_username',
+                                                                    'email': 'filter_email', 'staff': 'only_staff'})
+
+    def test_skipped_filter_method_is_logged(self):
+        class HelperUserManager(UserManager):
+            def filter_usernames(self, usernames):
+                return usernames
+        with self.assertLogs(level='WARNING') as logs:
+            self.assertNotIn('usernames', HelperUserManager.get_filter_dispatch_table())
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('filter_usernames()', logs.output[0])
+
+    def test_helpers_are_not_called_for_request_params(self):
+        for param_name in ('usernames', 'row_query_fields', 'startfiltering', 'endfiltering', 'on_model'):
+            queryset = self.manager.apply_filters(User.objects.order_by('pk'), {param_name: 'x'})
+            self.assertEqual(queryset.count(), 2)
+
+    def test_filters_are_applied(self):
+        self.assertEqual([user.username for user in self.manager.apply_filters(User.objects.all(), {'staff': 'true'})], ['staff_user'])
+        self.assertEqual([user.username for user in self.manager.apply_filters(User.objects.all(), {'username': 'other_user'})], ['other_user'])
+
+
+class CountingUserSerializer(UserSerializer):
+    instances = 0
+
+    def __init__(self, *args, **kwargs):
+        CountingUserSerializer.instances = CountingUserSerializer.instances + 1
+        super(CountingUserSerializer, self).__init__(*args, **kwargs)
+
+
+class ListQueryPlanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for idx in range(3):
+            User.objects.create(username='user_%02d' % idx)
+
+    def test_serializer_is_built_once_for_query_plan(self):
+        controller = BaseController()
+        controller.manager = UserManager()
+        controller.serializer_class = CountingUserSerializer
+        CountingUserSerializer.instances = 0
+        request = RequestFactory().get('/api/')
+        response = controller.service_list(request, {'data_source': 'FILE', 'query_params': {}, 'request_params': {}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(CountingUserSerializer.instances, 2)  # query plan, serialization of rows
+
+
+class QueryInspectorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        group = Group.objects.create(name='staff')
+        for idx in range(6):
+            User.objects.create(username='user_%02d' % idx).groups.add(group)
+
+    def test_counts_queries_and_finds_n_plus_one(self):
+        with QueryInspector(n_plus_one_threshold=5) as inspector:
+            names = [[group.name for group in user.groups.all()] for user in User.objects.all()]
+        self.assertEqual(len(names), 6)
+        self.assertEqual(inspector.query_count, 7)
+        n_plus_one = inspector.n_plus_one()
+        self.assertEqual(len(n_plus_one), 1)
+        self.assertEqual(n_plus_one[0]['count'], 6)
+
+    def test_prefetch_has_no_n_plus_one(self):
+        with QueryInspector(n_plus_one_threshold=5, budget=2, raise_on_budget=True) as inspector:
+            list(User.objects.prefetch_related('groups'))
+        self.assertEqual(inspector.query_count, 2)
+        self.assertFalse(inspector.n_plus_one())
+
+    def test_budget_is_raised_on_exit(self):
+        with self.assertRaises(QueryBudgetExceeded) as context:
+            with QueryInspector(budget=2, raise_on_budget=True):
+                for idx in range(4):
+                    User.objects.filter(pk=idx).exists()
+        self.assertEqual(context.exception.query_count, 4)
+
+    def test_budget_does_not_hide_database_error(self):
+        with self.assertRaises(DatabaseError):
+            with QueryInspector(budget=0, raise_on_budget=True):
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT * FROM table_does_not_exist")
+
+
+class SessionUserManager(UserManager):
+    session_values = None
+
+    def filter_username(self, value, queryset, request_params=None):
+        self.get_filter_session()['username'] = value
+        time.sleep(0.05)  # other thread runs its filters meanwhile
+        self.session_values.append((value, self.get_filter_session()['username']))
+        return queryset.filter(username=value)
+
+
+class FilterSessionTests(TestCase):
+
+    def setUp(self):
+        self.manager = SessionUserManager()
+        self.manager.session_values = []
+
+    def test_filter_sessions_are_kept_per_thread(self):
+        threads = [threading.Thread(target=self.manager.apply_filters, args=(User.objects.none(), {'username': name}))
+                   for name in ('first', 'second')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(self.manager.session_values), [('first', 'first'), ('second', 'second')])
+        self.assertIsNone(self.manager.get_filter_session())
+
+    def test_request_params_are_not_changed(self):
+        params = {'username': 'first'}
+        self.manager.apply_filters(User.objects.none(), params)
+        self.assertEqual(params, {'username': 'first'})
+
+    def test_nested_apply_filters_keeps_outer_session(self):
+        outer_session = {}
+
+        def filter_username(value, queryset, request_params=None):
+            outer_session['before'] = self.manager.get_filter_session()
+            UserManager().apply_filters(User.objects.none(), {'first_name': value})
+            outer_session['after'] = self.manager.get_filter_session()
+            return queryset
+        self.manager.filter_username = filter_username
+        self.manager.apply_filters(User.objects.none(), {'username': 'first'})
+        self.assertIsNotNone(outer_session['before'])
+        self.assertIs(outer_session['after'], outer_session['before'])
+
+
+class UserGroupLinkManager(OneToManyRelationshipModelManager):
+
+    def __init__(self):
+        super(UserGroupLinkManager, self).__init__('auth', 'User', 'User_groups', 'user', 'group')
+
+    @staticmethod
+    def get_manager_name():
+        return "UserGroupLinkManager"
+
+
+class SaveLinkTableTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='linked_user')
+        cls.groups = [Group.objects.create(name='group_%s' % index) for index in range(3)]
+
+    def test_links_are_added_removed_and_kept(self):
+        manager = UserGroupLinkManager()
+        self.user.groups.add(self.groups[0], self.groups[1])
+        new_rows, del_rows, no_change_rows, linked_objects = manager.save_link_table(
+            self.user, [self.groups[1], str(self.groups[2].id)])
+        self.assertEqual((new_rows, del_rows, no_change_rows), (1, 1, 1))
+        self.assertEqual(sorted(row['group_id'] for row in linked_objects), [self.groups[1].id, self.groups[2].id])
+
+    def test_failed_insert_keeps_deleted_links(self):
+        manager = UserGroupLinkManager()
+        self.user.groups.add(self.groups[0])
+        with mock.patch.object(manager.linkedTableModel.objects, 'bulk_create', side_effect=DatabaseError('insert failed')):
+            with self.assertRaises(DatabaseError):
+                manager.save_link_table(self.user, [self.groups[1]])
+        self.assertEqual(list(self.user.groups.all()), [self.groups[0]])
+
+
+class SqlLoggingTests(TestCase):
+
+    def setUp(self):
+        self.manager = UserManager()
+
+    @override_settings(SQL_LOG_SLOW_MS=0.000001)
+    def test_slow_queries_are_logged_outside_requests(self):
+        with self.assertLogs(level='WARNING') as logs:
+            list(self.manager.Model.objects.all())
+        self.assertTrue(any('Slow query' in line and 'auth_user' in line for line in logs.output))
+
+    def test_slow_query_logger_is_installed_once(self):
+        list(User.objects.all())
+        self.assertEqual(len([wrapper for wrapper in connection.execute_wrappers if isinstance(wrapper, SlowQueryLogger)]), 1)
+
+    @override_settings(SQL_LOG_SAMPLE_RATE=2)
+    def test_sample_rate_is_read_from_settings_on_each_call(self):
+        with self.assertLogs(level='INFO') as logs:
+            for idx in range(4):
+                self.manager.log_sql(User.objects.all(), params={})
+        self.assertEqual(len(logs.output), 2)
@@ -1,3 +1,85 @@
-from django.test import TestCase
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from project.config.logger_file_handler import LoggerFileHandler
+
+
+def log_in_worker_process(file_name, start_barrier, message):
+    handler = LoggerFileHandler(file_name, when='midnight')
+    handler.rolloverAt = 0  # rollover is due
+    start_barrier.wait()  # all workers have opened the file before it is rotated
+    handler.emit(logging.makeLogRecord({'msg': message}))
+    handler.close()
+
+
+class LoggerFileHandlerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dir_name = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.dir_name, 'app.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_name)
+
+    def get_rotated_files(self):
+        return sorted(name for name in os.listdir(self.dir_name) if name.startswith('app_'))
+
+    def emit(self, handler, message):
+        handler.emit(logging.makeLogRecord({'msg': message}))
+
+    def test_file_rotated_by_other_handler_is_not_rotated_again(self):
+        first = LoggerFileHandler(self.file_name, when='midnight')
+        second = LoggerFileHandler(self.file_name, when='midnight')
+        try:
+            first.rolloverAt = second.rolloverAt = 0
+            self.emit(first, 'first')
+            self.emit(second, 'second')
+            self.assertEqual(len(self.get_rotated_files()), 1)
+            self.assertGreater(second.rolloverAt, time.time())
+            with open(self.file_name) as log_file:
+                self.assertEqual(log_file.read(), 'first\nsecond\n')
+        finally:
+            first.close()
+            second.close()
+
+    def test_rollover_error_is_written_to_stderr(self):
+        handler = LoggerFileHandler(self.file_name, when='midnight')
+        try:
+            handler.rolloverAt = 0
+            with mock.patch('os.rename', side_effect=OSError('rename failed')), \
+                    mock.patch('sys.stderr', new_callable=StringIO) as stderr:
+                self.emit(handler, 'message')
+            self.assertIn('rename failed', stderr.getvalue())
+            with open(self.file_name) as log_file:
+                self.assertEqual(log_file.read(), 'message\n')
+        finally:
+            handler.close()
+
+    def test_rotation_under_concurrent_processes(self):
+        with open(self.file_name, 'w') as log_file:
+            log_file.write('old\n')
+        start_barrier = multiprocessing.Barrier(5)
+        processes = [multiprocessing.Process(target=log_in_worker_process,
+                                             args=(self.file_name, start_barrier, 'worker %s' % index))
+                     for index in range(4)]
+        for process in processes:
+            process.start()
+        start_barrier.wait(10)
+        for process in processes:
+            process.join(10)
+            self.assertEqual(process.exitcode, 0)
+
+        self.assertEqual(len(self.get_rotated_files()), 1)
+        lines = []
+        for name in self.get_rotated_files() + ['app.log']:
+            with open(os.path.join(self.dir_name, name)) as log_file:
+                lines.extend(log_file.read().splitlines())
+        self.assertEqual(sorted(lines), ['old'] + ['worker %s' % index for index in range(4)])
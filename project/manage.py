@@ -4,6 +4,8 @@ import sys
 
 if __name__ == '__main__':
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+    from project.startup_profiler import install_startup_profiler
+    install_startup_profiler()  # only if environment variable STARTUP_PROFILE=1
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -1,26 +1,82 @@
 import sys
+import time
 import traceback
 import logging
+from contextlib import ExitStack
+from functools import lru_cache
 
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
 
+try:
+    import pytz
+except ImportError:
+    pytz = None
+
+
+import django
 from django.http import HttpResponse
 from django.shortcuts import redirect
 from django.template import loader, exceptions
 
 from django.conf import settings
+from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 from django.http import HttpResponseRedirect
 
 from django.middleware.csrf import CsrfViewMiddleware
+from django.db import connections
+
+from apis.common.utilities.request_timing import start_request_timer, clear_request_timer, record_request_metrics, \
+    get_request_timing_settings, is_server_timing_header
 
 
 class CustomMainMiddleware(MiddlewareMixin):
+    '''
+        Instrumentation of request: wall time, database time and number of queries, time of render and sections 
+        recorded by Controller (manager, serializer), see apis/common/utilities/request_timing.py
+    '''
     def process_request(self, request):
         # Process the request
-        pass
+        timing_settings = get_request_timing_settings()
+        if not timing_settings['ENABLED']:
+            return None
+        timer = start_request_timer()
+        exit_stack = ExitStack()
+        for alias in connections:
+            exit_stack.enter_context(connections[alias].execute_wrapper(timer))
+        request._request_timer = timer
+        request._request_timer_exit_stack = exit_stack
+        return None
+
+    def process_template_response(self, request, response):
+        # Response (e.g. DRF Response) is rendered after this method
+        timer = getattr(request, '_request_timer', None)
+        if timer:
+            request._render_start_time = time.time()
+        return response
 
     def process_response(self, request, response):
         # Process the response
+        timer = getattr(request, '_request_timer', None)
+        if timer is None:
+            return response
+        try:
+            request._request_timer_exit_stack.close()
+            render_start_time = getattr(request, '_render_start_time', None)
+            if render_start_time:
+                timer.add_section('render', time.time() - render_start_time)
+            timer.stop()
+            if is_server_timing_header():
+                response['Server-Timing'] = timer.server_timing()
+            record_request_metrics(timer)
+        except Exception as e:
+            logging.info("Path middleware/custom_middleware.py  Class: CustomMainMiddleware Method: process_response(...)  Error: %s" % (str(e)))
+        finally:
+            request._request_timer = None
+            clear_request_timer()
         return response
 
 class CustomCsrfMiddleware(CsrfViewMiddleware):
@@ -33,8 +89,43 @@ class CustomCsrfMiddleware(CsrfViewMiddleware):
             return redirect(request_path)
         return reason
 
+'''
+    Resolve timezone by name (e.g. "Asia/Kolkata"), resolved timezones are cached (LRU). 
+    Django < 3.2 supports only pytz timezones (e.g. timezone.make_aware() calls localize()), so pytz is used there, 
+    ZoneInfo otherwise. Returns None for unknown name.
+'''
+@lru_cache(maxsize=128)
+def get_timezone(tzname):
+    if pytz is not None and (django.VERSION < (3, 2) or ZoneInfo is None):
+        try:
+            return pytz.timezone(tzname)
+        except pytz.UnknownTimeZoneError:
+            return None
+    if ZoneInfo is not None:
+        try:
+            return ZoneInfo(tzname)
+        except (ZoneInfoNotFoundError, ValueError):
+            return None
+    return None
+
+
 class TimezoneMiddleware(MiddlewareMixin):
+    '''
+        Activate timezone of client (cookie "timezone") for current request (thread), instead of global settings, 
+        so timezone.localtime() (e.g. BaseSerializer.date_str_format) use client's timezone. 
+    '''
     @staticmethod
     def process_request(request):
         tzname = request.COOKIES.get('timezone') or settings.TIME_ZONE
-        settings.CLIENT_TIME_ZONE = tzname
\ No newline at end of file
+        tz = get_timezone(tzname) if tzname else None
+        if tz is not None:
+            timezone.activate(tz)
+            request.client_time_zone = tzname
+        else:
+            timezone.deactivate()
+            request.client_time_zone = settings.TIME_ZONE
+
+    @staticmethod
+    def process_response(request, response):
+        timezone.deactivate()  # thread is reused by next request
+        return response
\ No newline at end of file
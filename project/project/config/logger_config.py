@@ -3,6 +3,12 @@ Application logger configuration used in application
 '''
 
 import datetime
+import os
+
+# True: loggers write records in a bounded queue and one listener thread (per process) writes them in files,
+# see project/config/logger_queue_handler.py
+LOG_QUEUE_ENABLED = os.environ.get('LOG_QUEUE_ENABLED', 'false').strip().lower() in ('1', 'true', 'yes')
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
 
 LOGGING = {
     'version': 1,
@@ -31,10 +37,11 @@ LOGGING = {
         # },
         'default': {
             'level':'DEBUG',
-            'class':'logging.handlers.TimedRotatingFileHandler',
+            'class':'project.config.logger_file_handler.LoggerFileHandler', # rotation is safe across processes (workers)
             'filename': 'logs/project_log.log',
             'when': 'midnight', # this specifies the interval
             'interval': 1, # defaults to 1, only necessary for other values
+            'maxBytes': 1024*1024*50, # 50 MB, size based rollover alongside the time based one
             #'backupCount': 10, # how many backup file to keep, 10 days
             'formatter':'standard', #'verbose',
         },
@@ -86,4 +93,22 @@ LOGGING = {
         # },
 
     }
-}
\ No newline at end of file
+}
+
+
+if LOG_QUEUE_ENABLED:
+    # Each logger's handlers are moved to a target logger "log_queue.<logger>", which is used by listener thread only
+    for logger_name, logger_config in list(LOGGING['loggers'].items()):
+        target_logger_name = 'log_queue.' + (logger_name or 'root')
+        queue_handler_name = 'queue_' + (logger_name or 'root')
+        LOGGING['handlers'][queue_handler_name] = {
+            'class': 'project.config.logger_queue_handler.LoggerQueueHandler',
+            'target_logger': target_logger_name,
+            'queue_size': LOG_QUEUE_SIZE,
+        }
+        LOGGING['loggers'][target_logger_name] = {
+            'handlers': logger_config['handlers'],
+            'level': 'DEBUG',
+            'propagate': False
+        }
+        logger_config['handlers'] = [queue_handler_name]
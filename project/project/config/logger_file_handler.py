@@ -5,9 +5,16 @@ try:
 except ImportError:
     codecs = None
 
+try:
+    import fcntl
+except ImportError:  # e.g. Windows, rotation is not locked across processes
+    fcntl = None
+
 import logging.handlers
+import sys
 import time
 import os
+import traceback
 from os import path
 from datetime import datetime, timedelta
 
@@ -15,70 +22,159 @@ import logging.handlers as handlers
 
 """
     Handler for logging to a file, rotating the log file at certain timed
-    intervals.
+    intervals, or when file reach maxBytes (if maxBytes > 0).
+    
+    Rotated file is named for the start of the interval i.e. "<name>_<YYYY-MM-DD>.log", for size based rollover 
+    a counter is added i.e. "<name>_<YYYY-MM-DD>.<N>.log".
+    
+    It is safe when several processes (e.g. gunicorn workers) share same file: rollover is done under an 
+    exclusive lock (fcntl) of "<file>.lock", by one process; other processes find that file is rotated (inode 
+    of file name is changed) and reopen it. Lock is never waited for, if another process is rotating, 
+    rollover is tried again on next record.
     
     If backupCount is > 0, when rollover is done, no more than backupCount
     files are kept - the oldest ones are deleted.
 """
 class LoggerFileHandler(handlers.TimedRotatingFileHandler): # logging.handlers.TimedRotatingFileHandler
-    is_locked = False  # Class Variable
+    stat_check_interval = 1  # seconds, how often file name is checked for rotation by another process
 
     def __init__(self, filename, maxBytes=0, backupCount=0, encoding=None, delay=0, when='h', interval=1, utc=False):
         handlers.TimedRotatingFileHandler.__init__( self, filename, when, interval, backupCount, encoding, delay, utc)
-        # self.maxBytes = maxBytes
+        self.maxBytes = maxBytes
+        self.lock_file_name = self.baseFilename + ".lock"
+        self.next_stat_check = 0
+
+    def shouldRollover(self, record):
+        if self.is_rotated_by_other_process():
+            self.reopen_rotated_stream()
+        if handlers.TimedRotatingFileHandler.shouldRollover(self, record):
+            return 1
+        if self.maxBytes > 0:
+            if self.stream is None:
+                self.stream = self._open()
+            msg = "%s\n" % self.format(record)
+            self.stream.seek(0, 2)  # due to non-posix-compliant Windows feature
+            if self.stream.tell() + len(msg) >= self.maxBytes:
+                return 1
+        return 0
+
+    def get_stream_inode(self):
+        try:
+            return os.fstat(self.stream.fileno()).st_ino if self.stream else None
+        except (OSError, ValueError):
+            return None
+
+    def is_rotated_by_other_process(self, force=False):
+        now = time.time()
+        if self.stream is None or (not force and now < self.next_stat_check):
+            return False
+        self.next_stat_check = now + self.stat_check_interval
+        try:
+            return os.stat(self.baseFilename).st_ino != self.get_stream_inode()
+        except OSError:
+            return True  # file is renamed, but not created yet
+
+    def reopen_stream(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self.stream = self._open()
+
+    '''
+        File is already rotated by another process: reopen it, and if time rollover was due, compute next
+        rolloverAt, so the new file is not rotated again by this process.
+    '''
+    def reopen_rotated_stream(self):
+        self.reopen_stream()
+        currentTime = int(time.time())
+        if currentTime >= self.rolloverAt:
+            self.rolloverAt = self.compute_next_rollover(currentTime)
+
+    def acquire_rollover_lock(self):
+        if fcntl is None:
+            return True, None
+        lock_file = open(self.lock_file_name, 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True, lock_file
+        except (IOError, OSError):
+            lock_file.close()
+            return False, None
+
+    def release_rollover_lock(self, lock_file):
+        if lock_file:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            finally:
+                lock_file.close()
+
+    def get_rollover_file_name(self, date_str):
+        dirName, baseName = os.path.split(self.baseFilename)
+        baseName = baseName.rsplit('.', 1)[0]
+        new_file_name = os.path.join(dirName, baseName + "_" + date_str + ".log")
+        counter = 1
+        while path.exists(new_file_name):
+            new_file_name = os.path.join(dirName, "%s_%s.%s.log" % (baseName, date_str, counter))
+            counter = counter + 1
+        return new_file_name
+
+    def getFilesToDelete(self):
+        dirName, baseName = os.path.split(self.baseFilename)
+        prefix = baseName.rsplit('.', 1)[0] + "_"
+        result = []
+        for file_name in os.listdir(dirName):
+            if file_name.startswith(prefix) and file_name.endswith(".log"):
+                result.append(os.path.join(dirName, file_name))
+        if len(result) <= self.backupCount:
+            return []
+        result.sort(key=lambda file_name: os.path.getmtime(file_name))
+        return result[:len(result) - self.backupCount]
 
     """
             do a rollover; in this case, a date/time stamp is appended to the filename
             when the rollover happens.  However, you want the file to be named for the
             start of the interval, not the current time.  If there is a backup count,
             then we have to get a list of matching filenames, sort them and remove
-            the one with the oldest suffix.
+            the oldest ones.
     """
     def doRollover(self):
-        file_name = self.baseFilename
-
-        if self.stream:
-            self.stream.close()
-            self.stream = None
-            try:
-                if path.exists(file_name):
-                    dirName, baseName = os.path.split(file_name)
-                    #os.path.splitext(file_name)
-                    baseName = baseName.rsplit('.', 1)[0]
-                    new_file_name = dirName + "/" + baseName + "_" + datetime.strftime(datetime.now() - timedelta(1), '%Y-%m-%d') + ".log"
-                    os.rename(file_name, new_file_name)
-            except Exception as e:
-                print(str(e))
-
-
-
-                # get the time that this sequence started at and make it a TimeTuple
         currentTime = int(time.time())
+        is_time_rollover = currentTime >= self.rolloverAt
+        is_locked, lock_file = self.acquire_rollover_lock()
+        if not is_locked:
+            return  # another process is rotating file, retry on next record
+        try:
+            if self.is_rotated_by_other_process(force=True):
+                self.reopen_rotated_stream()  # already rotated by another process
+            else:
+                if self.stream:
+                    self.stream.close()
+                    self.stream = None
+                if path.exists(self.baseFilename):
+                    if is_time_rollover:
+                        t = self.rolloverAt - self.interval
+                        timeTuple = time.gmtime(t) if self.utc else time.localtime(t)
+                    else:
+                        timeTuple = time.gmtime(currentTime) if self.utc else time.localtime(currentTime)
+                    os.rename(self.baseFilename, self.get_rollover_file_name(time.strftime('%Y-%m-%d', timeTuple)))
+                if self.backupCount > 0:
+                    for s in self.getFilesToDelete():
+                        os.remove(s)
+                self.stream = self._open()
+        except Exception:
+            # like logging.Handler.handleError(), logging here would enter this handler again
+            sys.stderr.write("--- Logging error in LoggerFileHandler.doRollover() ---\n")
+            traceback.print_exc(file=sys.stderr)
+            if self.stream is None:
+                self.stream = self._open()
+        finally:
+            self.release_rollover_lock(lock_file)
+
+        if is_time_rollover:
+            self.rolloverAt = self.compute_next_rollover(currentTime)
+
+    def compute_next_rollover(self, currentTime):
         dstNow = time.localtime(currentTime)[-1]
-        t = self.rolloverAt - self.interval
-        if self.utc:
-            timeTuple = time.gmtime(t)
-        else:
-            timeTuple = time.localtime(t)
-            dstThen = timeTuple[-1]
-            if dstNow != dstThen:
-                if dstNow:
-                    addend = 3600
-                else:
-                    addend = -3600
-                timeTuple = time.localtime(t + addend)
-
-        # dfn = self.rotation_filename(self.baseFilename + "." + time.strftime(self.suffix, timeTuple))
-        dfn = self.rotation_filename(file_name)
-
-        if os.path.exists(dfn):
-            os.remove(dfn)
-        self.rotate(self.baseFilename, dfn)
-        if self.backupCount > 0:
-            for s in self.getFilesToDelete():
-                os.remove(s)
-        if not self.delay:
-            self.stream = self._open()
         newRolloverAt = self.computeRollover(currentTime)
         while newRolloverAt <= currentTime:
             newRolloverAt = newRolloverAt + self.interval
@@ -92,8 +188,7 @@ class LoggerFileHandler(handlers.TimedRotatingFileHandler): # logging.handlers.T
                 else:           # DST bows out before next rollover, so we need to add an hour
                     addend = 3600
                 newRolloverAt += addend
-
-        self.rolloverAt = newRolloverAt
+        return newRolloverAt
 
 
 
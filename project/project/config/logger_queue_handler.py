@@ -0,0 +1,117 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+
+import logging.handlers as handlers
+
+"""
+    Non-blocking logging: LoggerQueueHandler is attached to loggers (it is used by request threads), it only puts
+    records in a bounded queue. One listener thread (per process) owns actual (file) handlers and writes records,
+    so request threads never wait for disk writes or rollover.
+
+    If queue is full, record is dropped and counted (see get_dropped_records() and metric "log_records_dropped_total").
+
+    Actual handlers are attached to a "target logger" (with propagate False), listener thread passes records to it.
+    Configuration (logger_config.LOGGING):
+        'handlers': {
+            'queue_default': {
+                'class': 'project.config.logger_queue_handler.LoggerQueueHandler',
+                'target_logger': 'log_queue.default',
+                'queue_size': 10000,
+            },
+        },
+        'loggers': {
+            '': {'handlers': ['queue_default'], ...},
+            'log_queue.default': {'handlers': ['default'], 'level': 'DEBUG', 'propagate': False},
+        }
+"""
+_listener = None
+_listener_lock = threading.Lock()
+
+
+class LogQueueListener(object):
+    _sentinel = None
+
+    def __init__(self, queue_size=10000):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.pid = os.getpid()
+        self.dropped_records = 0
+        self.thread = threading.Thread(target=self.monitor, name='LogQueueListener')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def enqueue(self, queue_handler, record):
+        try:
+            self.queue.put_nowait((queue_handler, record))
+            return True
+        except queue.Full:
+            self.dropped_records = self.dropped_records + 1
+            return False
+
+    def monitor(self):
+        while True:
+            item = self.queue.get()
+            if item is self._sentinel:
+                break
+            queue_handler, record = item
+            try:
+                queue_handler.get_target_logger().handle(record)
+            except Exception:
+                queue_handler.handleError(record)
+
+    def stop(self, timeout=5):
+        if self.pid != os.getpid() or not self.thread.is_alive():
+            return
+        try:
+            self.queue.put(self._sentinel, timeout=timeout)
+            self.thread.join(timeout)
+        except queue.Full:
+            pass
+
+
+'''
+    Description: Return listener of current process, it is started on first use. After fork (e.g. gunicorn workers)
+        listener thread of parent does not exist in child process, so a new listener is started.
+    Parameters:
+        1. queue_size (Integer): max number of records in queue
+    Returns:    LogQueueListener
+    Exception:  None
+'''
+def get_listener(queue_size=10000):
+    global _listener
+    listener = _listener
+    if listener is not None and listener.pid == os.getpid():
+        return listener
+    with _listener_lock:
+        if _listener is None or _listener.pid != os.getpid():
+            _listener = LogQueueListener(queue_size)
+            atexit.register(_listener.stop)
+        return _listener
+
+
+def get_dropped_records():
+    listener = _listener
+    return listener.dropped_records if listener is not None and listener.pid == os.getpid() else 0
+
+
+class LoggerQueueHandler(handlers.QueueHandler):
+    def __init__(self, target_logger, queue_size=10000):
+        handlers.QueueHandler.__init__(self, None)
+        self.target_logger = target_logger
+        self.queue_size = queue_size
+
+    def get_target_logger(self):
+        return logging.getLogger(self.target_logger)
+
+    def enqueue(self, record):
+        if not get_listener(self.queue_size).enqueue(self, record):
+            self.count_dropped_record()
+
+    def count_dropped_record(self):
+        try:
+            from apis.common.utilities.request_timing import metrics_registry
+            metrics_registry.inc('log_records_dropped_total', description='Log records dropped because logging queue is full')
+        except Exception:
+            pass
@@ -0,0 +1,128 @@
+'''
+Startup profiler: reports import time of our modules (like "python -X importtime", but only for packages of this
+project) and time of initialization steps (e.g. load_on_startup). It is enabled by environment variable
+STARTUP_PROFILE=1 and installed (before Django is set up) in manage.py and project/wsgi.py. Report is written in
+log and stderr at the end of load_on_startup().
+Self time of a module includes third-party modules imported by it (e.g. requests, celery), so it shows which of our
+modules pull heavy dependencies.
+'''
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILED_PACKAGES = ('apis', 'project', 'middleware', 'main')
+
+_profiler = None
+
+
+class TimingLoader(object):
+    '''
+        Wrap loader of a module, to measure execution time of module (self time, without imports of our other modules).
+    '''
+    def __init__(self, loader, profiler):
+        self.loader = loader
+        self.profiler = profiler
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        self.profiler.start_item(module.__name__)
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.profiler.end_item(module.__name__)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class StartupProfiler(object):
+    '''
+        Meta path finder, which wrap loaders of modules of PROFILED_PACKAGES with TimingLoader.
+    '''
+    def __init__(self, packages=PROFILED_PACKAGES):
+        self.packages = packages
+        self.start_time = time.time()
+        self.items = []  # (name, self time, cumulative time, depth)
+        self.local = threading.local()
+        self.is_reported = False
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname.split('.')[0] not in self.packages:
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = TimingLoader(spec.loader, self)
+                return spec
+        return None
+
+    def get_stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def start_item(self, name):
+        self.get_stack().append([name, time.time(), 0.0])
+
+    def end_item(self, name):
+        stack = self.get_stack()
+        item_name, start_time, children_time = stack.pop()
+        cumulative_time = time.time() - start_time
+        if stack:
+            stack[-1][2] = stack[-1][2] + cumulative_time
+        self.items.append((item_name, cumulative_time - children_time, cumulative_time, len(stack)))
+
+    @contextmanager
+    def section(self, name):
+        self.start_item(name)
+        try:
+            yield
+        finally:
+            self.end_item(name)
+
+    def report(self):
+        lines = ["Startup profile (%.2f ms since profiler installed):" % ((time.time() - self.start_time) * 1000),
+                 "%12s | %12s | %s" % ("self [ms]", "cumulative", "module / step")]
+        for name, self_time, cumulative_time, depth in self.items:
+            lines.append("%12.2f | %12.2f | %s%s" % (self_time * 1000, cumulative_time * 1000, "  " * depth, name))
+        slowest = sorted(self.items, key=lambda item: -item[1])[:10]
+        lines.append("Slowest (self time): " + ", ".join("%s %.2f ms" % (item[0], item[1] * 1000) for item in slowest))
+        return "\n".join(lines)
+
+
+def install_startup_profiler():
+    global _profiler
+    if _profiler is None and os.environ.get('STARTUP_PROFILE', '').strip().lower() in ('1', 'true', 'yes'):
+        _profiler = StartupProfiler()
+        sys.meta_path.insert(0, _profiler)
+    return _profiler
+
+
+'''
+    Measure an initialization step (e.g. "load_on_startup"), it does nothing if profiler is not installed.
+'''
+@contextmanager
+def startup_section(name):
+    if _profiler is None:
+        yield
+    else:
+        with _profiler.section(name):
+            yield
+
+
+def report_startup_profile():
+    if _profiler is None or _profiler.is_reported:
+        return
+    _profiler.is_reported = True
+    report = _profiler.report()
+    logging.info("Path: project/startup_profiler.py Source: report_startup_profile()\n%s", report)
+    sys.stderr.write(report + "\n")
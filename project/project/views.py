@@ -1,7 +1,10 @@
 import traceback
 import logging
 
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render
+
+from project.startup_profiler import startup_section, report_startup_profile
 # Create your views here.
 
 
@@ -13,13 +16,33 @@ def error_404(request):
 	data = {}
 	return render(request,'common/404.html', data)
 
+def metrics(request):
+	'''
+	In-process metrics (request timing histograms), in Prometheus text format or JSON (?format=json).
+	It is available only if settings.REQUEST_TIMING['METRICS_ENDPOINT'] is True.
+	'''
+	from apis.common.utilities.request_timing import get_request_timing_settings, metrics_registry
+	if not get_request_timing_settings()['METRICS_ENDPOINT']:
+		raise Http404()
+	if request.GET.get('format', '') == 'json':
+		return JsonResponse(metrics_registry.to_dict())
+	return HttpResponse(metrics_registry.to_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 def load_on_startup():
 	try:
 		# print("Something....")
 		# raise Exception("This is a sample Exception!")
 
-		from apis.components.factories.managers_factory import ManagersFactory
-		ManagersFactory.get_instance().register_all_managers()
+		with startup_section('load_on_startup()'):
+			from django.conf import settings
+			from apis.components.factories.managers_factory import ManagersFactory
+			managers_factory = ManagersFactory.get_instance()
+			managers_factory.register_all_managers()  # Managers are instantiated lazily, on first use
+			if getattr(settings, 'MANAGERS_WARM_UP_ON_STARTUP', False):
+				for manager_name, construction_time in managers_factory.warm_up():
+					logging.info("Path: project/views.py Source: load_on_startup() Manager: %s  Time: %.2f ms", manager_name, construction_time * 1000)
 	except Exception as e:
 		logging.info("Path: project/views.py Source: load_on_startup() Error: %s", str(e))
 		logging.info(traceback.format_exc())
+	finally:
+		report_startup_profile()  # only if startup profiler is enabled (STARTUP_PROFILE=1)
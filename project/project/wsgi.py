@@ -9,6 +9,9 @@ https://docs.djangoproject.com/en/2.1/howto/deployment/wsgi/
 
 import os
 
+from project.startup_profiler import install_startup_profiler
+install_startup_profiler()  # only if environment variable STARTUP_PROFILE=1, before Django is set up
+
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')